@@ -4,10 +4,10 @@ import streamlit as st
 if 'language' not in st.session_state:
     st.session_state.language = 'cs'
 
-from scripts.db import Database
+from scripts.db import get_database
 from scripts.translations import TRANSLATIONS
 from scripts.config import setup_page_config
-from scripts.shared import navigation, display_image
+from scripts.shared import navigation, display_image, facet_filters
 
 # Set up universal page configuration with page-specific title
 setup_page_config('browse_collection')
@@ -20,13 +20,30 @@ def t(key):
 navigation(t)
 
 # Initialize database
-db = Database()
+db = get_database()
 
 # Main content
 st.title(t('browse_collection'))
 
-# Display all recipes
-dishes = db.get_all_dishes()
+# Number of recipe cards per page
+PAGE_SIZE = 20
+
+# Filter chips, counted and applied in SQL
+categories, types = facet_filters(db, t, 'browse')
+
+# Cursors of the pages visited so far; the first page has no cursor.
+# Changing the filters starts again from the first page.
+if st.session_state.get('browse_filters') != (categories, types):
+    st.session_state.browse_filters = (categories, types)
+    st.session_state.browse_cursors = [None]
+
+# Load only the card fields of the current page
+dishes, next_cursor = db.list_dishes(
+    after=st.session_state.browse_cursors[-1],
+    limit=PAGE_SIZE,
+    categories=categories,
+    types=types
+)
 
 if not dishes:
     st.info(t('no_recipes_available'))
@@ -37,15 +54,33 @@ else:
         with cols[idx % 2]:
             st.subheader(dish['name'])
             
-            # Display image if it exists
+            # Display image if it exists, preferring the small grid thumbnail
             if dish['image_path']:
-                display_image(dish['image_path'], caption=dish['name'])
+                display_image(dish['thumbnail_path'] or dish['image_path'], caption=dish['name'])
             
             st.write(f"**{t('category')}:** {dish['category']}")
             st.write(f"**{t('type')}:** {dish['type']}")
-            st.write(f"**{t('ingredients')}:**")
-            st.write(dish['ingredients'])
-            if dish['instructions']:
-                st.write(f"**{t('note')}:**")
-                st.write(dish['instructions'])
-            st.divider() 
\ No newline at end of file
+            
+            # Load the full text only when the card is opened
+            if st.toggle(t('show_recipe'), key=f"show_recipe_{dish['id']}"):
+                details = db.get_dish(dish['id'], ('ingredients', 'instructions'))
+                if details:
+                    st.write(f"**{t('ingredients')}:**")
+                    st.write(details['ingredients'])
+                    if details['instructions']:
+                        st.write(f"**{t('note')}:**")
+                        st.write(details['instructions'])
+            st.divider()
+
+    # Page navigation
+    col1, col2 = st.columns(2)
+    with col1:
+        if len(st.session_state.browse_cursors) > 1:
+            if st.button(t('previous_page'), use_container_width=True):
+                st.session_state.browse_cursors.pop()
+                st.rerun()
+    with col2:
+        if next_cursor is not None:
+            if st.button(t('next_page'), use_container_width=True):
+                st.session_state.browse_cursors.append(next_cursor)
+                st.rerun()
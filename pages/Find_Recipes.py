@@ -4,10 +4,10 @@ import streamlit as st
 if 'language' not in st.session_state:
     st.session_state.language = 'cs'
 
-from scripts.db import Database
+from scripts.db import get_database
 from scripts.translations import TRANSLATIONS
 from scripts.config import setup_page_config
-from scripts.shared import navigation, display_image
+from scripts.shared import navigation, display_image, facet_filters
 
 # Set up universal page configuration with page-specific title
 setup_page_config('find_recipes')
@@ -20,32 +20,29 @@ def t(key):
 navigation(t)
 
 # Initialize database
-db = Database()
+db = get_database()
 
 # Main content
 st.title(t('find_recipes'))
 
-# Search section
-search_query = st.text_input(t('search_placeholder'), "")
-
-# Display recipes
-dishes = db.get_all_dishes()
-if search_query:
-    dishes = [dish for dish in dishes if search_query.lower() in dish['name'].lower() 
-             or search_query.lower() in dish['ingredients'].lower()]
-
-if not dishes:
-    st.info(t('no_recipes_found'))
-else:
-    # Display dishes in a grid layout
+# Function to display dishes in a grid layout
+def show_dishes(dishes):
     cols = st.columns(2)
     for idx, dish in enumerate(dishes):
         with cols[idx % 2]:
             st.subheader(dish['name'])
             
-            # Display image if it exists
+            # Show where the search terms matched
+            if dish.get('snippet'):
+                st.caption(dish['snippet'])
+            
+            # Show what is missing for pantry matches
+            if dish.get('missing_ingredients'):
+                st.caption(f"{t('pantry_missing')}: {', '.join(dish['missing_ingredients'])}")
+            
+            # Display image if it exists, preferring the small grid thumbnail
             if dish['image_path']:
-                display_image(dish['image_path'], caption=dish['name'])
+                display_image(dish['thumbnail_path'] or dish['image_path'], caption=dish['name'])
             
             st.write(f"**{t('category')}:** {dish['category']}")
             st.write(f"**{t('type')}:** {dish['type']}")
@@ -54,4 +51,38 @@ else:
             if dish['instructions']:
                 st.write(f"**{t('note')}:**")
                 st.write(dish['instructions'])
-            st.divider() 
\ No newline at end of file
+            st.divider()
+
+search_tab, pantry_tab = st.tabs([t('search_tab'), t('pantry_tab')])
+
+with search_tab:
+    # Search section
+    search_query = st.text_input(t('search_placeholder'), "")
+    categories, types = facet_filters(db, t, 'find')
+    
+    # Display recipes, ranked by the full-text index when searching
+    if search_query:
+        dishes = db.search(search_query, categories=categories, types=types)
+    else:
+        dishes = db.get_all_dishes(categories=categories, types=types)
+    
+    if not dishes:
+        st.info(t('no_recipes_found'))
+    else:
+        show_dishes(dishes)
+
+with pantry_tab:
+    # Pantry section
+    pantry_query = st.text_input(t('pantry_placeholder'), "")
+    pantry = [item for item in pantry_query.split(",") if item.strip()]
+    
+    if pantry:
+        dishes = db.find_by_pantry(pantry)
+        if not dishes:
+            st.info(t('no_recipes_found'))
+        # Group results by how many ingredients are missing
+        for missing, title_key in enumerate(['pantry_all', 'pantry_missing_one', 'pantry_missing_two']):
+            group = [dish for dish in dishes if dish['missing'] == missing]
+            if group:
+                st.markdown(f"### {t(title_key)}")
+                show_dishes(group)
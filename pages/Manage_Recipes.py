@@ -5,7 +5,8 @@ if 'language' not in st.session_state:
     st.session_state.language = 'cs'
 
 import os
-from scripts.db import Database
+from scripts.db import get_database
+from scripts.categories import join_categories, split_categories
 from scripts.translations import TRANSLATIONS
 import time
 from scripts.config import setup_page_config
@@ -55,7 +56,22 @@ if not st.session_state.authenticated:
 # Show content only if authenticated
 if st.session_state.authenticated:
     # Initialize database
-    db = Database()
+    db = get_database()
+
+    # Show background sync state instead of waiting for each upload
+    sync_status = db.sync_status()
+    if sync_status['last_error']:
+        retry_at = time.strftime('%H:%M:%S', time.localtime(sync_status['next_retry_at']))
+        st.warning(f"{t('sync_failed')} ({t('sync_retry_at')} {retry_at}): {sync_status['last_error']}")
+    elif sync_status['pending']:
+        st.caption(t('sync_pending'))
+    elif sync_status['last_synced_sha']:
+        st.caption(f"{t('sync_done')} ({sync_status['last_synced_sha'][:7]})")
+    api_stats = db.api_stats()
+    if api_stats and api_stats['remaining'] is not None:
+        st.caption(f"{t('api_quota')}: {api_stats['remaining']}/{api_stats['limit']}")
+    query_stats = db.query_cache_stats()
+    st.caption(f"{t('query_cache')}: {query_stats['hit_rate']:.0%} ({query_stats['entries']}/{query_stats['max_entries']})")
 
     # Add new recipe section
     st.subheader(t('add_recipe'))
@@ -93,18 +109,11 @@ if st.session_state.authenticated:
         submit = st.form_submit_button(t('add_recipe'))
         
         if submit and name and ingredients:
-            image_path = None
-            if uploaded_file is not None:
-                try:
-                    image_path = db.github_service.upload_image(uploaded_file, f"{name}_{uploaded_file.name}")
-                except Exception as e:
-                    st.error(f"Failed to upload image: {str(e)}")
-                    st.stop()
-            
             # Join categories with a comma
-            category_str = ", ".join(categories) if categories else t('uncategorized')
+            category_str = join_categories(categories) if categories else t('uncategorized')
             
-            if db.add_dish(name, ingredients, note, category_str, type, image_path):
+            # The image is committed together with the database
+            if db.add_dish(name, ingredients, note, category_str, type, uploaded_file):
                 st.success(t('recipe_added'))
                 st.toast(t('recipe_added'))
                 time.sleep(1)
@@ -131,7 +140,7 @@ if st.session_state.authenticated:
                     new_note = st.text_area(t('note'), value=dish['instructions'])
                     
                     # Add category and type selection for editing
-                    current_categories = dish['category'].split(", ") if dish['category'] else []
+                    current_categories = split_categories(dish['category'])
                     valid_categories = [
                         "Snídaně 🥯",
                         "Svačina 🍏",
@@ -170,18 +179,12 @@ if st.session_state.authenticated:
                     
                     if st.form_submit_button(t('update_recipe')):
                         # Join categories with a comma
-                        new_category_str = ", ".join(new_categories) if new_categories else t('uncategorized')
+                        new_category_str = join_categories(new_categories) if new_categories else t('uncategorized')
                         
-                        # Handle image upload
-                        new_image_path = dish['image_path']  # Keep existing image by default
-                        if new_image is not None:
-                            try:
-                                new_image_path = db.github_service.upload_image(new_image, f"{new_name}_{new_image.name}")
-                            except Exception as e:
-                                st.error(f"Failed to upload image: {str(e)}")
-                                st.stop()
+                        # Keep existing image unless a new one was uploaded
+                        new_image_data = new_image if new_image is not None else dish['image_path']
                         
-                        if db.update_dish(dish['id'], new_name, new_ingredients, new_note, new_category_str, new_type, new_image_path):
+                        if db.update_dish(dish['id'], new_name, new_ingredients, new_note, new_category_str, new_type, new_image_data):
                             st.success(t('recipe_updated'))
                             st.toast(t('recipe_updated'))
                             time.sleep(1)
@@ -0,0 +1,19 @@
+"""Generate thumbnail and medium variants for recipe images that don't have them.
+
+Run from the repository root, with the same Streamlit secrets as the app:
+
+    python -m scripts.backfill_images
+"""
+from scripts.db import Database
+
+def main():
+    db = Database()
+    updated = db.backfill_image_variants()
+    print(f"Created image variants for {updated} recipe(s), uploading...")
+    if not db.sync_worker.flush():
+        print(f"Upload failed: {db.sync_status()['last_error']}")
+        raise SystemExit(1)
+    print("Done")
+
+if __name__ == "__main__":
+    main()
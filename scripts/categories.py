@@ -0,0 +1,28 @@
+"""Recipe categories, stored both as a display string on dishes and normalized.
+
+dishes.category keeps the comma-joined form the pages show, while the
+categories / dish_categories tables hold one row per category so that
+filtering and counting happen in SQL.
+"""
+from typing import List
+
+CATEGORY_SEPARATOR = ", "
+
+def split_categories(category: str) -> List[str]:
+    """Split a stored category string into distinct category names."""
+    names = [name.strip() for name in (category or '').split(CATEGORY_SEPARATOR.strip())]
+    return list(dict.fromkeys(name for name in names if name))
+
+def join_categories(categories: List[str]) -> str:
+    """Join category names into the string stored on dishes."""
+    return CATEGORY_SEPARATOR.join(categories)
+
+def index_dish_categories(c, dish_id: int, category: str):
+    """Replace the normalized categories of a dish with those in its category string."""
+    c.execute('DELETE FROM dish_categories WHERE dish_id = ?', (dish_id,))
+    for name in split_categories(category):
+        c.execute('INSERT OR IGNORE INTO categories (name) VALUES (?)', (name,))
+        c.execute('''
+            INSERT OR IGNORE INTO dish_categories (dish_id, category_id)
+            SELECT ?, id FROM categories WHERE name = ?
+        ''', (dish_id, name))
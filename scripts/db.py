@@ -1,84 +1,808 @@
 import sqlite3
 import os
+import re
 import base64
-from typing import List, Dict, Any
-from .github_service import GitHubService
+import contextlib
+import io
+import functools
+import tempfile
+import threading
+import weakref
+from typing import List, Dict, Any, Callable, Iterator, Optional, Set, Tuple
+from .github_service import ConflictError, GitHubService, DEFAULT_MAX_WORKERS
+from .sync import ChangeWatcher, SyncWorker, DEFAULT_POLL_INTERVAL, DEFAULT_SYNC_DELAY
+from .verify import Verifier, DEFAULT_VERIFY_MODE, git_blob_sha_bytes
+from .categories import index_dish_categories
+from .images import content_filename, make_variants, variant_filename
+from .ingredients import index_dish_ingredients, normalize_term
+from .snapshot import Snapshot
+from .query_cache import QueryCache, DEFAULT_MAX_ENTRIES
+from .oplog import COMPACT_RATIO, format_op_log, get_clock, make_entries, op_log_name, parse_op_log, set_clock
+from .migrations import MIGRATIONS, SCHEMA_VERSION, get_schema_version, set_schema_version
+import requests
 import streamlit as st
 
+# Columns of the dishes table that can be loaded
+DISH_COLUMNS = ('id', 'name', 'ingredients', 'instructions', 'category', 'type',
+                'image_path', 'thumbnail_path', 'medium_path', 'created_at', 'updated_at')
+# Columns needed to render a recipe card, without the long text fields
+CARD_COLUMNS = ('id', 'name', 'category', 'type', 'image_path', 'thumbnail_path')
+# Original image and its resized variants
+IMAGE_COLUMNS = ('image_path', 'thumbnail_path', 'medium_path')
+
+# First bytes of every SQLite database file
+SQLITE_HEADER = b"SQLite format 3\x00"
+# Connection tuning: seconds to wait for a lock, prepared statements kept
+# per connection, bytes of the file to memory-map and page cache size (KiB)
+BUSY_TIMEOUT = 10.0
+CACHED_STATEMENTS = 256
+MMAP_SIZE = 64 * 1024 * 1024
+CACHE_SIZE_KIB = 16 * 1024
+# Times a sync pulls, replays local changes and retries after another replica pushed first
+CONFLICT_RETRIES = 3
+
+# Live Database of each file; two would race each other on the file and on GitHub
+_open_databases: Dict[str, 'Database'] = {}
+_open_databases_lock = threading.Lock()
+
+def fts_query(text: str) -> str:
+    """Turn user input into an FTS5 query that prefix-matches every word."""
+    # Quoting each word keeps FTS5 operators and punctuation from being parsed
+    words = re.findall(r"\w+", text)
+    return " ".join(f'"{word}"*' for word in words)
+
+def dish_filters(categories: Optional[List[str]] = None, types: Optional[List[str]] = None,
+                 alias: str = 'dishes') -> Tuple[List[str], List[Any]]:
+    """Build SQL conditions keeping dishes in any of the categories and any of the types.
+
+    Returns:
+        The conditions to AND into a WHERE clause and their bound parameters
+    """
+    conditions = []
+    params = []
+    if categories:
+        conditions.append(f'''{alias}.id IN (
+            SELECT dc.dish_id FROM dish_categories dc
+            JOIN categories cat ON cat.id = dc.category_id
+            WHERE cat.name IN ({', '.join('?' for _ in categories)})
+        )''')
+        params.extend(categories)
+    if types:
+        conditions.append(f"{alias}.type IN ({', '.join('?' for _ in types)})")
+        params.extend(types)
+    return conditions, params
+
+def synchronized(method):
+    """Serialize calls to a Database method across the sessions sharing it."""
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+def cached_query(action: str, fallback: Callable[[], Any]):
+    """Serve repeated calls of a Database read method from the query cache.
+
+    Results are keyed by the snapshot version too, so a result read just before
+    a change can never be served after it. A failed query returns the fallback
+    instead, which isn't cached, so the next call tries again.
+
+    Args:
+        action: What the method does, for the error message
+        fallback: Makes the result returned when the query fails
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            # Lists of filter values are the only unhashable arguments
+            freeze = lambda value: tuple(value) if isinstance(value, list) else value
+            params = (tuple(map(freeze, args)), tuple(sorted((name, freeze(value)) for name, value in kwargs.items())))
+            key = (method.__name__, params, self._snapshot.version)
+            try:
+                return self.query_cache.get(key, lambda: method(self, *args, **kwargs))
+            except ValueError:
+                # Invalid arguments are the caller's mistake, not a failed query
+                raise
+            except Exception as e:
+                print(f"Error {action}: {str(e)}")
+                return fallback()
+        return wrapper
+    return decorator
+
 class Database:
-    def __init__(self, db_name: str = "cookbook.db"):
+    def __init__(self, db_name: str = "cookbook.db", sync_delay: float = DEFAULT_SYNC_DELAY,
+                 verify_mode: str = DEFAULT_VERIFY_MODE, github_workers: int = DEFAULT_MAX_WORKERS,
+                 poll_interval: float = DEFAULT_POLL_INTERVAL, query_cache_size: int = DEFAULT_MAX_ENTRIES):
+        # Reentrant so public methods can call each other while holding it
+        self._lock = threading.RLock()
         try:
-            self.github_service = GitHubService()
+            self.github_service = GitHubService(max_workers=github_workers)
             self.use_github = True
             self.db_name = db_name
+            # Row-level changes pushed since the last snapshot; see scripts/oplog.py
+            self.op_log_name = op_log_name(db_name)
+            # (snapshot clock, entries) of the log as last fetched or pushed
+            self._op_log = (0, [])
+            # Increased whenever the local database is synced, so pulls can tell their download is stale
+            self._generation = 0
+            # Long-lived connection of each thread, dropped with the thread
+            self._connections = weakref.WeakKeyDictionary()
+            # In-memory copy of the database that all reads are served from
+            self._snapshot = None
+            # Results of read queries, dropped whenever a new snapshot is published
+            self.query_cache = QueryCache(query_cache_size)
+            # Checks downloaded and uploaded copies; see scripts/verify.py for the modes
+            self.verifier = Verifier(verify_mode)
+            # Problem met while starting up, for pages to show until GitHub is reachable again.
+            # Built once per process, so it must not call st.* itself: Streamlit would
+            # replay those messages on every page of every session.
+            self.startup_warning = None
+            # Image changes waiting to be committed with the next database sync
+            self._pending_files = {}
+            # Dish changes not yet on GitHub; pushed as operation log entries, replayed on conflict
+            self._pending_changes = []
+            self._closed = False
+            # A previous instance, e.g. one dropped by clearing Streamlit's resource
+            # cache, must stop touching the file and GitHub before this one starts
+            with _open_databases_lock:
+                previous = _open_databases.get(os.path.abspath(db_name))
+                _open_databases[os.path.abspath(db_name)] = self
+            if previous is not None:
+                previous.close()
+            # Uploads recipe edits in the background, several edits per commit
+            self.sync_worker = SyncWorker(self._upload_db, sync_delay)
             self.init_db()
             self.migrate_db()
+            self._publish_snapshot()
+            # Picks up changes pushed by others, off the page render path
+            self.watcher = ChangeWatcher(self._poll_github, poll_interval)
         except Exception as e:
-            st.error(f"GitHub integration is required but not available: {str(e)}")
+            print(f"GitHub integration is required but not available: {str(e)}")
+            if hasattr(self, '_closed'):
+                # Don't leave the workers of a half-built instance running
+                self.close()
             raise
 
     def _get_connection(self):
-        """Get a database connection."""
-        return sqlite3.connect(self.db_name)
+        """Get the current thread's database connection, opening and tuning it on first use.
+
+        Connections stay open so SQLite's page cache and Python's prepared
+        statement cache carry over between calls.
+        """
+        if self._closed:
+            raise Exception("Database is closed")
+        thread = threading.current_thread()
+        conn = self._connections.get(thread)
+        if conn is None:
+            # Only used while holding self._lock, but may be closed by another thread
+            conn = sqlite3.connect(self.db_name, timeout=BUSY_TIMEOUT,
+                                   cached_statements=CACHED_STATEMENTS, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode = WAL")
+            # WAL commits stay consistent without an fsync per transaction
+            conn.execute("PRAGMA synchronous = NORMAL")
+            conn.execute(f"PRAGMA mmap_size = {MMAP_SIZE}")
+            conn.execute(f"PRAGMA cache_size = -{CACHE_SIZE_KIB}")
+            self._connections[thread] = conn
+        return conn
+
+    def close(self):
+        """Stop the background workers, push pending edits and close the database file.
+
+        Reads keep being served from the last snapshot, but writes fail. Called
+        when another Database takes over the same file.
+        """
+        if getattr(self, 'watcher', None):
+            self.watcher.stop()
+        if getattr(self, 'sync_worker', None):
+            self.sync_worker.stop()
+        with self._lock:
+            self._closed = True
+            self._close_connections()
+        self.github_service.close()
+        with _open_databases_lock:
+            if _open_databases.get(os.path.abspath(self.db_name)) is self:
+                del _open_databases[os.path.abspath(self.db_name)]
+
+    def _close_connections(self):
+        """Close every pooled connection so the database file can be replaced or removed.
+
+        Closing the last connection checkpoints the write-ahead log; any log left
+        behind by a crash is removed so it can't be applied to a different file.
+        """
+        for conn in list(self._connections.values()):
+            conn.close()
+        self._connections.clear()
+        for suffix in ('-wal', '-shm'):
+            if os.path.exists(self.db_name + suffix):
+                os.remove(self.db_name + suffix)
+
+    def _publish_snapshot(self):
+        """Publish the database as written so far as the snapshot readers use.
+
+        Must be called while holding the lock, after every change to the file.
+        """
+        version = self._snapshot.version + 1 if self._snapshot else 1
+        # Assignment is atomic, so readers see either the old or the new snapshot
+        self._snapshot = Snapshot(version, self._get_connection())
+        self.query_cache.clear()
+
+    @contextlib.contextmanager
+    def _reader(self):
+        """Get a read-only connection to the current snapshot for the duration of a query.
+
+        The change watcher keeps the snapshot current, so reads never wait on
+        GitHub or on the lock writers hold.
+        """
+        snapshot = self._snapshot
+        conn = snapshot.acquire()
+        try:
+            yield conn
+        finally:
+            snapshot.release(conn)
+
+    @property
+    def version(self) -> int:
+        """Version of the snapshot reads are served from, increased by every change.
+
+        Sessions can compare it with the version they last rendered to tell
+        cheaply whether anything changed.
+        """
+        return self._snapshot.version
+
+    def _poll_github(self) -> bool:
+        """Load the database from GitHub if it changed there, taking the lock only to swap it in.
+
+        Returns:
+            True if a newer version was loaded
+        """
+        if not self.use_github:
+            return False
+        version = self._snapshot.version
+        self._get_db_from_github()
+        # GitHub answered, so a fallback to the local copy at startup no longer matters
+        self.startup_warning = None
+        return self._snapshot.version != version
+
+    def _db_size(self) -> int:
+        """Get the size of the database in bytes, including changes still in the WAL."""
+        conn = self._get_connection()
+        return conn.execute("PRAGMA page_count").fetchone()[0] * conn.execute("PRAGMA page_size").fetchone()[0]
+
+    def _checkpoint(self):
+        """Move everything in the write-ahead log into the database file itself."""
+        self._get_connection().execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+    def _upload_db(self, compact: bool = False) -> str:
+        """Push the changes not yet on GitHub, together with queued images, in one commit.
+
+        Dish changes are appended to the operation log, so an edit transfers the
+        log instead of the whole database. A full snapshot of the database (with
+        an empty log) is pushed instead when compact is set or the log has grown
+        past COMPACT_RATIO of the database.
+
+        The commit only lands if the database and log on GitHub are still the
+        versions last pulled or pushed. If another replica pushed first, they are
+        pulled, the local changes not yet pushed are replayed on top and the
+        upload is retried. Errors are raised for the caller (usually the sync
+        worker) to report.
+
+        Returns:
+            The blob SHA of the pushed database, or of the log if only it was pushed
+        """
+        for attempt in range(CONFLICT_RETRIES + 1):
+            # Hold the lock only while reading so writers aren't blocked on the upload
+            with self._lock:
+                files = self._pending_files
+                self._pending_files = {}
+                changes = self._pending_changes
+                self._pending_changes = []
+                expected_shas = {path: self.github_service.known_sha(path) for path in (self.db_name, self.op_log_name)}
+                
+                conn = self._get_connection()
+                clock = get_clock(conn.cursor())
+                snapshot_clock, entries = self._op_log
+                entries = entries + make_entries(changes, clock)
+                op_log_size = len(format_op_log(snapshot_clock, entries).encode('utf-8'))
+                if compact or op_log_size > COMPACT_RATIO * self._db_size():
+                    clock += len(changes)
+                    # The snapshot includes every entry so far, so the log starts over
+                    set_clock(conn.cursor(), clock)
+                    conn.commit()
+                    op_log = (clock, [])
+                    # Committed changes may still be in the WAL file, which isn't uploaded
+                    self._checkpoint()
+                    # Verify the database is valid before syncing
+                    self.verifier.verify(self.db_name)
+                    with open(self.db_name, 'rb') as f:
+                        # Upload the raw bytes; the database is never treated as text
+                        files[self.db_name] = f.read()
+                else:
+                    op_log = (snapshot_clock, entries)
+                files[self.op_log_name] = format_op_log(*op_log).encode('utf-8')
+            try:
+                # Images, log and database land in one commit
+                blob_shas = self.github_service.commit_files(
+                    files, "Update database", expected_shas=expected_shas
+                )
+            except Exception as e:
+                with self._lock:
+                    # Requeue the images unless a newer change to the same path was queued
+                    for path, content in files.items():
+                        if path not in (self.db_name, self.op_log_name):
+                            self._pending_files.setdefault(path, content)
+                    # Keep the changes for replay, ahead of any made since
+                    self._pending_changes = changes + self._pending_changes
+                    if isinstance(e, ConflictError) and attempt < CONFLICT_RETRIES:
+                        self._rebase()
+                        continue
+                raise
+            
+            with self._lock:
+                self._op_log = op_log
+                self._generation += 1
+                if op_log[1]:
+                    # The database already holds the pushed changes
+                    conn = self._get_connection()
+                    set_clock(conn.cursor(), op_log[1][-1]['clock'])
+                    conn.commit()
+            if self.db_name not in files:
+                return blob_shas[self.op_log_name]
+            # GitHub's blob SHA is a content hash, so a mismatch means the upload was damaged
+            if blob_shas[self.db_name] != git_blob_sha_bytes(files[self.db_name]):
+                self.verifier.report_mismatch()
+                raise Exception("Uploaded database does not match the local copy")
+            return blob_shas[self.db_name]
+
+    def _rebase(self):
+        """Replace the local database with the GitHub version and replay unpushed changes on it."""
+        if not self._get_db_from_github(force=True):
+            raise Exception("Database was removed from GitHub")
+        conn = self._get_connection()
+        c = conn.cursor()
+        try:
+            # Start transaction
+            c.execute("BEGIN TRANSACTION")
+            self._pending_changes = self._replay_changes(c, self._pending_changes)
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        self._publish_snapshot()
+
+    def _record_change(self, c, op: str, dish_id: int, files: Dict[str, Any], old_image_path: Optional[str] = None):
+        """Remember a committed dish change so it can be replayed if its push conflicts.
+
+        Args:
+            op: 'insert', 'update' or 'delete'
+            dish_id: Id of the changed dish
+            files: File changes queued with it
+            old_image_path: image_path of the dish before the change
+        """
+        removed_files = [path for path, content in files.items() if content is None]
+        change = {
+            'op': op,
+            'id': dish_id,
+            'values': None,
+            'image_file': None,
+            # Image the change deleted from the repository, if any
+            'removed_image': old_image_path if removed_files else None,
+            'removed_files': removed_files,
+        }
+        if op != 'delete':
+            c.execute(f"SELECT {', '.join(DISH_COLUMNS[1:])} FROM dishes WHERE id = ?", (dish_id,))
+            change['values'] = dict(c.fetchone())
+            prefix = self.github_service.get_image_url('')
+            image_path = change['values']['image_path']
+            if image_path and image_path.startswith(prefix):
+                c.execute('SELECT * FROM image_files WHERE filename = ?', (image_path[len(prefix):],))
+                row = c.fetchone()
+                change['image_file'] = dict(row) if row else None
+        self._pending_changes.append(change)
+
+    def _replay_changes(self, c, changes: List[Dict[str, Any]], keep_ids: bool = False) -> List[Dict[str, Any]]:
+        """Apply recorded dish changes on top of a freshly pulled database.
+
+        Dishes added locally get new ids; edits of dishes deleted on GitHub in
+        the meantime are dropped, so the deletion wins.
+
+        Args:
+            keep_ids: Insert dishes under their recorded ids, as when applying
+                log entries that every replica applies in the same order
+
+        Returns:
+            The changes with ids matching the rebased database
+        """
+        prefix = self.github_service.get_image_url('')
+        ids = {}
+        replayed = []
+        for change in changes:
+            dish_id = ids.get(change['id'], change['id'])
+            values = change['values']
+            if change['op'] == 'insert':
+                row = {'id': dish_id, **values} if keep_ids else values
+                c.execute(f"""
+                    INSERT INTO dishes ({', '.join(row)}) VALUES ({', '.join('?' for _ in row)})
+                """, tuple(row.values()))
+                dish_id = ids[change['id']] = c.lastrowid
+            elif change['op'] == 'update':
+                c.execute(f"""
+                    UPDATE dishes SET {', '.join(f'{column} = ?' for column in values)} WHERE id = ?
+                """, (*values.values(), dish_id))
+                if c.rowcount == 0:
+                    continue
+            else:
+                c.execute('DELETE FROM dishes WHERE id = ?', (dish_id,))
+            
+            if values:
+                index_dish_ingredients(c, dish_id, values['ingredients'])
+                index_dish_categories(c, dish_id, values['category'])
+                image_file = change['image_file']
+                if image_file:
+                    c.execute(f"""
+                        INSERT OR IGNORE INTO image_files ({', '.join(image_file)})
+                        VALUES ({', '.join('?' for _ in image_file)})
+                    """, tuple(image_file.values()))
+            removed_image = change['removed_image']
+            if removed_image:
+                c.execute('SELECT 1 FROM dishes WHERE image_path = ? LIMIT 1', (removed_image,))
+                if c.fetchone():
+                    # A dish pushed by someone else shows the image, so keep its files
+                    for path in change.get('removed_files', []):
+                        if path in self._pending_files and self._pending_files[path] is None:
+                            del self._pending_files[path]
+                elif removed_image.startswith(prefix):
+                    c.execute('DELETE FROM image_files WHERE filename = ?', (removed_image[len(prefix):],))
+            replayed.append({**change, 'id': dish_id})
+        return replayed
+
+    def _prepare_image(self, c, image_data, files: Dict[str, Any]) -> Dict[str, Optional[str]]:
+        """Add an image and its resized variants to a pending commit.
+
+        Images are stored under a hash of their content. Content already in the
+        image_files manifest is reused without uploading anything.
+
+        Returns:
+            The URLs they will be served from, keyed by their dishes column
+        """
+        images = dict.fromkeys(IMAGE_COLUMNS)
+        # URLs already point at a stored image
+        if isinstance(image_data, str) and image_data.startswith('http'):
+            images['image_path'] = image_data
+            return images
+        
+        # Handle different types of image data
+        if hasattr(image_data, 'name'):
+            # File upload object
+            original_name = image_data.name
+        else:
+            # For string data (base64), use a generic name
+            original_name = "image.png"
+        content = self.github_service.get_image_bytes(image_data)
+        filename = content_filename(content, original_name)
+        
+        # Identical content was stored before, so reuse it
+        c.execute('SELECT thumbnail_path, medium_path FROM image_files WHERE filename = ?', (filename,))
+        known = c.fetchone()
+        images['image_path'] = self.github_service.get_image_url(filename)
+        if known:
+            images['thumbnail_path'], images['medium_path'] = known
+            return images
+        
+        files[f"images/{filename}"] = content
+        images.update(self._prepare_image_variants(content, filename, files))
+        c.execute('''
+            INSERT INTO image_files (filename, original_name, size, thumbnail_path, medium_path)
+            VALUES (?, ?, ?, ?, ?)
+        ''', (filename, original_name, len(content), images['thumbnail_path'], images['medium_path']))
+        return images
+
+    def _prepare_image_variants(self, content: bytes, filename: str, files: Dict[str, Any]) -> Dict[str, str]:
+        """Add the thumbnail and medium variants of an image to a pending commit.
+
+        Returns:
+            Their URLs keyed by dishes column, empty if the image couldn't be resized
+        """
+        try:
+            variants = make_variants(content)
+        except Exception as e:
+            print(f"Warning: Could not create image variants for {filename}: {str(e)}")
+            return {}
+        urls = {}
+        for column, variant in variants.items():
+            variant_name = variant_filename(filename, column)
+            files[f"images/{variant_name}"] = variant
+            urls[column] = self.github_service.get_image_url(variant_name)
+        return urls
+
+    def _prepare_image_delete(self, c, dish_id: int, images: Dict[str, Optional[str]], files: Dict[str, Any]):
+        """Add the removal of a dish's image and its variants to a pending commit.
+
+        Nothing is removed while another dish still shows the same image.
+        """
+        if not images['image_path']:
+            return
+        c.execute('SELECT 1 FROM dishes WHERE image_path = ? AND id != ? LIMIT 1', (images['image_path'], dish_id))
+        if c.fetchone():
+            return
+        
+        prefix = self.github_service.get_image_url('')
+        for image_path in images.values():
+            # Only images in our repository can be removed from its tree
+            if image_path and image_path.startswith(prefix):
+                files[f"images/{image_path[len(prefix):]}"] = None
+        if images['image_path'].startswith(prefix):
+            c.execute('DELETE FROM image_files WHERE filename = ?', (images['image_path'][len(prefix):],))
+
+    def _queue_files(self, files: Dict[str, Any]):
+        """Queue file changes to be committed together with the next database sync."""
+        for path, content in files.items():
+            if content is None and self._pending_files.get(path) is not None:
+                # The image was never pushed, so there is nothing to remove remotely
+                del self._pending_files[path]
+            else:
+                self._pending_files[path] = content
 
     def _sync_db_to_github(self):
         """Sync the database file to GitHub."""
         try:
-            # Verify the database is valid before syncing
-            conn = self._get_connection()
-            c = conn.cursor()
-            c.execute("PRAGMA integrity_check")
-            result = c.fetchone()
-            if result[0] != "ok":
-                raise Exception("Database integrity check failed")
-            conn.close()
-
-            with open(self.db_name, 'rb') as f:
-                db_content = f.read()
-            # Convert to base64 for GitHub storage
-            db_content_b64 = base64.b64encode(db_content).decode('utf-8')
-            self.github_service.upload_file(db_content_b64, self.db_name, "Update database")
+            # Schema changes can't be expressed as dish changes, so push a full snapshot
+            self._upload_db(compact=True)
         except Exception as e:
-            st.error(f"Error syncing database to GitHub: {str(e)}")
+            print(f"Error syncing database to GitHub: {str(e)}")
             raise
 
-    def _get_db_from_github(self):
-        """Get the database file from GitHub."""
+    def verification_stats(self) -> Dict[str, Any]:
+        """Get the verification mode, check counts and last check timings."""
+        return self.verifier.stats()
+
+    def start_render(self):
+        """Give the page render on the current thread a fresh GitHub API call budget."""
+        if self.use_github:
+            self.github_service.start_render()
+
+    def api_stats(self) -> Optional[Dict[str, Any]]:
+        """Get the remaining GitHub API quota and call counters, or None without GitHub."""
+        return self.github_service.stats() if self.use_github else None
+
+    def query_cache_stats(self) -> Dict[str, Any]:
+        """Get the query cache hit rate, counters and size."""
+        return self.query_cache.stats()
+
+    def sync_status(self) -> Dict[str, Any]:
+        """Get the background sync state (pending, last synced SHA, last error)."""
+        return self.sync_worker.status()
+
+    def watch_status(self) -> Dict[str, Any]:
+        """Get the change watcher state (checks, changes, last error) and the current version."""
+        return {**self.watcher.status(), 'version': self.version}
+
+    def _get_db_from_github(self, force: bool = False):
+        """Get the database snapshot and operation log from GitHub and apply the log.
+
+        Downloads run without the lock, so edits aren't held up by GitHub; only
+        swapping in the new file and applying the log take it. A download is
+        dropped if the local database was synced meanwhile, since it may be
+        older than the copy now in place. Errors are raised for the caller to
+        report or fall back on the local copy.
+
+        Args:
+            force: Download even over local edits not yet pushed; the caller
+                holds the lock, replays them and publishes the result
+
+        Returns:
+            False if there is no database on GitHub
+        """
+        # Local edits still waiting for upload must not be overwritten
+        if self.sync_worker.pending and not force:
+            return True
+        generation = self._generation
+        
+        op_log = io.BytesIO()
+        op_log_sha = self.github_service.fetch_file(self.op_log_name, op_log, if_changed=not force)
+        # Download next to the live file so it can be swapped in atomically
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.db_name)), suffix='.download')
+        os.close(fd)
         try:
-            db_content = self.github_service.get_file_content(self.db_name)
-            if db_content:
-                # Decode base64 content
-                db_bytes = base64.b64decode(db_content)
-                with open(self.db_name, 'wb') as f:
-                    f.write(db_bytes)
-                
-                # Verify the database is valid after downloading
-                conn = self._get_connection()
-                c = conn.cursor()
-                c.execute("PRAGMA integrity_check")
-                result = c.fetchone()
-                conn.close()
-                
-                if result[0] != "ok":
-                    raise Exception("Downloaded database failed integrity check")
+            # Only download when the remote copy differs from the local one
+            db_sha = self._fetch_snapshot(tmp_path, if_changed=os.path.exists(self.db_name) and not force)
+            if db_sha is None:
+                return False
+            
+            with self._lock:
+                if self._closed or self._generation != generation or (self.sync_worker.pending and not force):
+                    # Synced, edited or closed while downloading; the next poll starts over
+                    return True
+                self._generation += 1
+                if op_log_sha is None:
+                    self._op_log = (0, [])
+                    self.github_service.forget_file(self.op_log_name)
+                elif op_log_sha is not GitHubService.UNCHANGED:
+                    self._op_log = parse_op_log(op_log.getvalue().decode('utf-8'))
+                    self.github_service.remember_file(self.op_log_name, op_log_sha)
+                replaced = db_sha is not GitHubService.UNCHANGED
+                if replaced:
+                    self._install_snapshot(tmp_path, db_sha)
+                if self._op_log[0] > self._get_clock():
+                    # The log was compacted into a snapshot newer than the one just checked
+                    db_sha = self._fetch_snapshot(tmp_path)
+                    if db_sha is None:
+                        raise Exception("Database was removed from GitHub")
+                    self._install_snapshot(tmp_path, db_sha)
+                    replaced = True
+                applied = self._apply_op_log()
+                if (replaced or applied) and self._snapshot and not force:
+                    self._publish_snapshot()
                 return True
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def _get_clock(self) -> int:
+        """Get the clock of the last log entry the local database includes."""
+        return get_clock(self._get_connection().cursor())
+
+    def _apply_op_log(self) -> bool:
+        """Apply the log entries the local database doesn't include yet.
+
+        Returns:
+            True if any were applied
+        """
+        snapshot_clock, entries = self._op_log
+        clock = self._get_clock()
+        if snapshot_clock > clock:
+            raise Exception("Operation log is ahead of the database snapshot")
+        entries = [entry for entry in entries if entry['clock'] > clock]
+        if not entries:
             return False
-        except Exception as e:
-            st.error(f"Error getting database from GitHub: {str(e)}")
+        conn = self._get_connection()
+        c = conn.cursor()
+        try:
+            # Start transaction
+            c.execute("BEGIN TRANSACTION")
+            self._replay_changes(c, entries, keep_ids=True)
+            set_clock(c, entries[-1]['clock'])
+            conn.commit()
+        except Exception:
+            conn.rollback()
             raise
+        return True
+
+    def _fetch_snapshot(self, path: str, if_changed: bool = False):
+        """Download the database snapshot into a file and verify it.
+
+        Returns:
+            Its blob SHA, UNCHANGED if it matches the local copy, or None if there is none on GitHub
+        """
+        with open(path, 'wb') as f:
+            sha = self.github_service.fetch_file(self.db_name, f, if_changed=if_changed)
+            if sha is None or sha is GitHubService.UNCHANGED:
+                return sha
+            f.flush()
+            os.fsync(f.fileno())
+        # The hash only matches the bytes as stored on GitHub
+        expected_sha = None if self._convert_legacy_db(path) else sha
+        # Verify the database is valid before anyone can read it
+        self.verifier.verify(path, expected_sha)
+        return sha
+
+    def _install_snapshot(self, path: str, sha: str):
+        """Replace the local database with a downloaded snapshot.
+
+        Must be called while holding the lock.
+        """
+        # Dishes the replaced file knew about, to report as deleted if they are gone
+        feed = self._change_feed_state()
+        self._close_connections()
+        os.replace(path, self.db_name)
+        self.github_service.remember_file(self.db_name, sha)
+        if feed:
+            self._continue_change_feed(*feed)
+
+    def _change_feed_state(self) -> Optional[Tuple[int, Set[int]]]:
+        """Get the change counter and the ids of all present and deleted dishes.
+
+        Returns:
+            None if there is no readable local database or it predates change tracking
+        """
+        if not self._is_sqlite_file(self.db_name):
+            return None
+        try:
+            c = self._get_connection().cursor()
+            c.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'change_counter'")
+            if not c.fetchone():
+                return None
+            c.execute('SELECT version FROM change_counter WHERE id = 1')
+            version = c.fetchone()[0]
+            c.execute('SELECT id FROM dishes UNION SELECT dish_id FROM deleted_dishes')
+            return version, {row[0] for row in c.fetchall()}
+        except sqlite3.DatabaseError:
+            return None
+
+    def _continue_change_feed(self, version: int, dish_ids: Set[int]):
+        """Keep the change feed going after the file was replaced by a downloaded snapshot.
 
+        The snapshot's row versions were counted by another replica, so every
+        dish in it is reported as changed once more, and every dish known before
+        but missing now as deleted, after any version already handed out.
+
+        Args:
+            version: Change counter of the replaced file
+            dish_ids: Present and deleted dishes of the replaced file
+        """
+        conn = self._get_connection()
+        c = conn.cursor()
+        c.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'change_counter'")
+        if not c.fetchone():
+            # Migrating the snapshot starts its feed
+            return
+        try:
+            # Start transaction
+            c.execute("BEGIN TRANSACTION")
+            c.execute('SELECT version FROM change_counter WHERE id = 1')
+            version = max(version, c.fetchone()[0]) + 1
+            c.execute('UPDATE change_counter SET version = ? WHERE id = 1', (version,))
+            c.execute('UPDATE dishes SET row_version = ?', (version,))
+            c.execute('SELECT id FROM dishes')
+            deleted = dish_ids - {row[0] for row in c.fetchall()}
+            c.execute('DELETE FROM deleted_dishes')
+            c.executemany('''
+                INSERT INTO deleted_dishes (dish_id, version, deleted_at) VALUES (?, ?, CURRENT_TIMESTAMP)
+            ''', [(dish_id, version) for dish_id in deleted])
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    @staticmethod
+    def _is_sqlite_file(path: str) -> bool:
+        """Whether a file exists and is an SQLite database, not the base64 text older versions stored."""
+        if not os.path.exists(path):
+            return False
+        with open(path, 'rb') as f:
+            return f.read(len(SQLITE_HEADER)) == SQLITE_HEADER
+
+    def _convert_legacy_db(self, path: str) -> bool:
+        """Decode a database stored by older versions as base64 text, in place.
+
+        Returns:
+            True if the file was converted
+        """
+        with open(path, 'rb') as f:
+            header = f.read(len(SQLITE_HEADER))
+        if header == SQLITE_HEADER:
+            return False
+        # One-off conversion; later syncs store the raw bytes
+        with open(path, 'rb') as f:
+            db_bytes = base64.b64decode(f.read())
+        with open(path, 'wb') as f:
+            f.write(db_bytes)
+            f.flush()
+            os.fsync(f.fileno())
+        return True
+
+    @synchronized
     def init_db(self):
         # Try to get existing database from GitHub
         try:
             if self._get_db_from_github():
                 return
         except Exception as e:
-            st.warning(f"Could not retrieve database from GitHub: {str(e)}")
-            # If file exists but is invalid, remove it
-            if os.path.exists(self.db_name):
-                os.remove(self.db_name)
+            # GitHub may still hold a database, so never push a new one over it
+            self.github_service.forget_file(self.db_name)
+            usable = self._is_sqlite_file(self.db_name)
+            if usable:
+                try:
+                    self.verifier.verify(self.db_name)
+                except Exception:
+                    usable = False
+            if not usable:
+                print(f"Could not retrieve database from GitHub: {str(e)}")
+                raise
+            self.startup_warning = f"Could not retrieve database from GitHub, using the local copy: {str(e)}"
+            return
             
-        # Create new database
+        # No database on GitHub yet, so create a new one
         conn = self._get_connection()
         c = conn.cursor()
         
@@ -101,43 +825,30 @@ class Database:
             
             # Commit transaction
             conn.commit()
-            
-            # Sync new database to GitHub
-            try:
-                self._sync_db_to_github()
-            except Exception as e:
-                st.warning(f"Could not sync database to GitHub: {str(e)}")
+            # migrate_db adds the rest of the schema and pushes the new database
         except Exception as e:
             conn.rollback()
-            st.error(f"Error initializing database: {str(e)}")
+            print(f"Error initializing database: {str(e)}")
             raise
-        finally:
-            conn.close()
 
+    @synchronized
     def migrate_db(self):
-        """Migrate the database to add new columns if they don't exist."""
+        """Apply pending schema migrations, syncing to GitHub only if any ran."""
         conn = self._get_connection()
         c = conn.cursor()
         
         try:
+            version = get_schema_version(c)
+            if version >= SCHEMA_VERSION:
+                # Schema is current, nothing to write or upload
+                return
+            
             # Start transaction
             c.execute("BEGIN TRANSACTION")
             
-            # Check if columns exist
-            c.execute("PRAGMA table_info(dishes)")
-            columns = [column[1] for column in c.fetchall()]
-            
-            # Add category column if it doesn't exist
-            if 'category' not in columns:
-                c.execute('ALTER TABLE dishes ADD COLUMN category TEXT NOT NULL DEFAULT "Hlavní jídlo 🍽️"')
-            
-            # Add type column if it doesn't exist
-            if 'type' not in columns:
-                c.execute('ALTER TABLE dishes ADD COLUMN type TEXT NOT NULL DEFAULT "Doma uvařené 🍳"')
-            
-            # Add image_path column if it doesn't exist
-            if 'image_path' not in columns:
-                c.execute('ALTER TABLE dishes ADD COLUMN image_path TEXT')
+            for migration in MIGRATIONS[version:]:
+                migration(c)
+            set_schema_version(c, SCHEMA_VERSION)
             
             # Commit transaction
             conn.commit()
@@ -147,93 +858,345 @@ class Database:
         except Exception as e:
             # Rollback transaction on error
             conn.rollback()
-            st.error(f"Error during database migration: {str(e)}")
+            print(f"Error during database migration: {str(e)}")
             raise
-        finally:
-            conn.close()
 
+    @synchronized
     def add_dish(self, name: str, ingredients: str, instructions: str, category: str, type: str, image_data=None) -> bool:
         conn = None
         try:
-            image_path = None
-            if image_data and self.use_github:
-                try:
-                    # Handle different types of image data
-                    if hasattr(image_data, 'name'):
-                        # File upload object
-                        filename = f"{name}_{image_data.name}"
-                    else:
-                        # For string data (URL or base64), use a generic name
-                        filename = f"{name}_image.png"
-                    image_path = self.github_service.upload_image(image_data, filename)
-                except Exception as e:
-                    st.warning(f"Image could not be uploaded: {str(e)}. Recipe will be added without image.")
-            
             conn = self._get_connection()
             c = conn.cursor()
             
             # Start transaction
             c.execute("BEGIN TRANSACTION")
             
+            images = dict.fromkeys(IMAGE_COLUMNS)
+            # Image changes go out in the same commit as the database
+            files = {}
+            if image_data and self.use_github:
+                try:
+                    images = self._prepare_image(c, image_data, files)
+                except Exception as e:
+                    st.warning(f"Image could not be uploaded: {str(e)}. Recipe will be added without image.")
+            
             c.execute('''
-                INSERT INTO dishes (name, ingredients, instructions, category, type, image_path)
-                VALUES (?, ?, ?, ?, ?, ?)
-            ''', (name, ingredients, instructions, category, type, image_path))
+                INSERT INTO dishes (name, ingredients, instructions, category, type, image_path, thumbnail_path, medium_path)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (name, ingredients, instructions, category, type,
+                  images['image_path'], images['thumbnail_path'], images['medium_path']))
+            dish_id = c.lastrowid
+            index_dish_ingredients(c, dish_id, ingredients)
+            index_dish_categories(c, dish_id, category)
             
             # Commit transaction
             conn.commit()
+            self._publish_snapshot()
             
-            # Sync updated database to GitHub if available
+            # Queue the updated database for upload to GitHub if available
             if self.use_github:
-                try:
-                    self._sync_db_to_github()
-                except Exception as e:
-                    st.warning(f"Database sync failed: {str(e)}")
+                self._record_change(c, 'insert', dish_id, files)
+                self._queue_files(files)
+                self.sync_worker.mark_dirty()
             return True
         except Exception as e:
             if conn:
                 conn.rollback()
             st.error(f"Error adding dish: {str(e)}")
             return False
-        finally:
-            if conn:
-                conn.close()
 
-    def get_all_dishes(self) -> List[Dict[str, Any]]:
-        conn = None
-        try:
-            # Get latest database from GitHub if available
-            if self.use_github:
-                self._get_db_from_github()
+    @synchronized
+    def backfill_image_variants(self, images_dir: str = "images") -> int:
+        """Create the missing thumbnail and medium variants of stored images.
+
+        Originals are read from the local checkout when present and downloaded
+        otherwise. All variants are queued for the next database sync.
+
+        Returns:
+            The number of dishes updated
+        """
+        conn = self._get_connection()
+        c = conn.cursor()
+        prefix = self.github_service.get_image_url('')
+        updated = 0
+        c.execute('''
+            SELECT id, image_path FROM dishes
+            WHERE image_path IS NOT NULL AND (thumbnail_path IS NULL OR medium_path IS NULL)
+        ''')
+        # Start every download at once and process them in order as they finish
+        reads = [
+            (dish_id, image_path[len(prefix):], self.github_service.submit(
+                self._read_image, image_path, os.path.join(images_dir, image_path[len(prefix):])
+            ))
+            for dish_id, image_path in c.fetchall() if image_path.startswith(prefix)
+        ]
+        for dish_id, filename, read in reads:
+            try:
+                content = read.result()
+            except Exception as e:
+                print(f"Warning: Could not read image {filename}: {str(e)}")
+                continue
             
-            conn = self._get_connection()
+            files = {}
+            variants = self._prepare_image_variants(content, filename, files)
+            if not variants:
+                continue
+            c.execute('''
+                UPDATE dishes SET thumbnail_path = ?, medium_path = ? WHERE id = ?
+            ''', (variants['thumbnail_path'], variants['medium_path'], dish_id))
+            conn.commit()
+            self._record_change(c, 'update', dish_id, files)
+            self._queue_files(files)
+            updated += 1
+        
+        if updated:
+            self._publish_snapshot()
+            if self.use_github:
+                self.sync_worker.mark_dirty()
+        return updated
+
+    @staticmethod
+    def _read_image(image_path: str, local_path: str) -> bytes:
+        """Read an image from the local checkout, downloading it when missing."""
+        if os.path.exists(local_path):
+            with open(local_path, 'rb') as f:
+                return f.read()
+        response = requests.get(image_path, timeout=60)
+        response.raise_for_status()
+        return response.content
+
+    @cached_query('getting dishes', list)
+    def get_all_dishes(self, categories: Optional[List[str]] = None, types: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        with self._reader() as conn:
             c = conn.cursor()
-            c.execute('SELECT id, name, ingredients, instructions, category, type, image_path FROM dishes')
-            dishes = []
-            for row in c.fetchall():
-                dishes.append({
-                    'id': row[0],
-                    'name': row[1],
-                    'ingredients': row[2],
-                    'instructions': row[3],
-                    'category': row[4],
-                    'type': row[5],
-                    'image_path': row[6]
-                })
-            return dishes
-        except Exception as e:
-            print(f"Error getting dishes: {str(e)}")
+            conditions, params = dish_filters(categories, types)
+            where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+            c.execute(f'''
+                SELECT id, name, ingredients, instructions, category, type, image_path, thumbnail_path, medium_path
+                FROM dishes
+                {where}
+            ''', params)
+            return [dict(row) for row in c.fetchall()]
+
+    @cached_query('listing dishes', lambda: ([], None))
+    def list_dishes(self, columns: Tuple[str, ...] = CARD_COLUMNS, order_by: str = 'name',
+                    after=None, limit: int = 20, categories: Optional[List[str]] = None,
+                    types: Optional[List[str]] = None) -> Tuple[List[Dict[str, Any]], Any]:
+        """Get one page of dishes using keyset pagination.
+
+        The cost of a page doesn't depend on how far into the collection it is,
+        and only the requested columns are read.
+
+        Args:
+            columns: Dish columns to load ('id' and the sort key are always included)
+            order_by: 'name' or 'id'
+            after: Cursor returned with the previous page, None for the first page
+            limit: Page size
+            categories: Only list dishes in any of these categories
+            types: Only list dishes of any of these types
+
+        Returns:
+            The dishes on the page and the cursor of the next page (None on the last page)
+        """
+        unknown = set(columns) - set(DISH_COLUMNS)
+        if unknown or order_by not in ('name', 'id'):
+            raise ValueError(f"Cannot list dishes by {order_by} with columns {', '.join(sorted(unknown))}")
+        key = ('name', 'id') if order_by == 'name' else ('id',)
+        # The sort key is always loaded so the next cursor can be built
+        columns = tuple(dict.fromkeys(('id',) + key + tuple(columns)))
+        
+        with self._reader() as conn:
+            c = conn.cursor()
+            # Columns and key come from the whitelists above, values are bound
+            conditions, params = dish_filters(categories, types)
+            if after is not None:
+                conditions.append(f"({', '.join(key)}) > ({', '.join('?' for _ in key)})")
+                params.extend(after)
+            where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+            # Fetch one extra row to know whether there is a next page
+            c.execute(f"""
+                SELECT {', '.join(columns)} FROM dishes
+                {where}
+                ORDER BY {', '.join(key)}
+                LIMIT ?
+            """, (*params, limit + 1))
+            rows = c.fetchall()
+            dishes = [dict(zip(columns, row)) for row in rows[:limit]]
+            next_cursor = None
+            if len(rows) > limit:
+                next_cursor = tuple(dishes[-1][column] for column in key)
+            return dishes, next_cursor
+
+    @cached_query('getting dish', lambda: None)
+    def get_dish(self, dish_id: int, columns: Tuple[str, ...] = DISH_COLUMNS) -> Optional[Dict[str, Any]]:
+        """Get selected columns of a single dish, or None if it doesn't exist."""
+        unknown = set(columns) - set(DISH_COLUMNS)
+        if unknown:
+            raise ValueError(f"Unknown dish columns: {', '.join(sorted(unknown))}")
+        with self._reader() as conn:
+            c = conn.cursor()
+            c.execute(f"SELECT {', '.join(columns)} FROM dishes WHERE id = ?", (dish_id,))
+            row = c.fetchone()
+            return dict(zip(columns, row)) if row else None
+
+    @cached_query('counting facets', lambda: {'categories': {}, 'types': {}})
+    def facets(self) -> Dict[str, Dict[str, int]]:
+        """Count dishes per category and per type in a single query.
+
+        Returns:
+            {'categories': {name: count}, 'types': {name: count}}, largest counts first
+        """
+        with self._reader() as conn:
+            c = conn.cursor()
+            c.execute('''
+                SELECT 'categories', cat.name, COUNT(*) AS dish_count
+                FROM dish_categories dc
+                JOIN categories cat ON cat.id = dc.category_id
+                GROUP BY cat.id
+                UNION ALL
+                SELECT 'types', type, COUNT(*) FROM dishes GROUP BY type
+                ORDER BY 1, 3 DESC, 2
+            ''')
+            facets = {'categories': {}, 'types': {}}
+            for facet, name, count in c.fetchall():
+                facets[facet][name] = count
+            return facets
+
+    @cached_query('searching dishes', list)
+    def search(self, query: str, limit: int = 50, categories: Optional[List[str]] = None,
+               types: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """Full-text search over recipe names, ingredients and instructions.
+
+        Every word in the query is matched as a prefix, ignoring case and
+        diacritics, and results are ranked by bm25 with the name weighted highest.
+
+        Args:
+            query: Free text typed by the user
+            limit: Maximum number of results
+            categories: Only return dishes in any of these categories
+            types: Only return dishes of any of these types
+
+        Returns:
+            Dishes with an extra 'name_highlight' and 'snippet' marked up in Markdown
+        """
+        match = fts_query(query)
+        if not match:
             return []
-        finally:
-            if conn:
-                conn.close()
+        with self._reader() as conn:
+            c = conn.cursor()
+            conditions, params = dish_filters(categories, types, alias='d')
+            filters = ''.join(f" AND {condition}" for condition in conditions)
+            c.execute(f'''
+                SELECT d.id, d.name, d.ingredients, d.instructions, d.category, d.type,
+                       d.image_path, d.thumbnail_path, d.medium_path,
+                       highlight(dishes_fts, 0, '**', '**') AS name_highlight,
+                       snippet(dishes_fts, -1, '**', '**', '…', 12) AS snippet
+                FROM dishes_fts
+                JOIN dishes d ON d.id = dishes_fts.rowid
+                WHERE dishes_fts MATCH ?{filters}
+                ORDER BY bm25(dishes_fts, 10.0, 5.0, 1.0)
+                LIMIT ?
+            ''', (match, *params, limit))
+            return [dict(row) for row in c.fetchall()]
+
+    @cached_query('finding dishes by pantry', list)
+    def find_by_pantry(self, pantry: List[str], max_missing: int = 2) -> List[Dict[str, Any]]:
+        """Find dishes that can be cooked from the ingredients at hand.
+
+        Pantry items are normalized like indexed ingredients, and an item covers
+        every ingredient containing all its words ("smetana" covers "zakysaná
+        smetana"). A recipe item with alternatives ("polohrubá/hladká mouka")
+        needs only one of them. Only the ingredient index is queried, never the
+        recipe text.
+
+        Args:
+            pantry: Ingredients the user has
+            max_missing: Largest number of missing ingredients to still list a dish
 
+        Returns:
+            Dishes ranked by fewest missing ingredients, each with 'missing' (count)
+            and 'missing_ingredients' (labels of what is lacking)
+        """
+        terms = list(dict.fromkeys(term for term in map(normalize_term, pantry) if term))
+        if not terms:
+            return []
+        with self._reader() as conn:
+            c = conn.cursor()
+            pantry_values = ", ".join("(?)" for _ in terms)
+            c.execute(f'''
+                WITH pantry(term) AS (VALUES {pantry_values}),
+                have(ingredient_id) AS (
+                    SELECT DISTINCT i.id FROM ingredients i
+                    JOIN pantry p ON ' ' || i.name || ' ' LIKE '% ' || p.term || ' %'
+                ),
+                candidates(dish_id) AS (
+                    SELECT DISTINCT dish_id FROM dish_ingredients
+                    WHERE ingredient_id IN (SELECT ingredient_id FROM have)
+                ),
+                items AS (
+                    -- An item is covered by any one of its alternatives
+                    SELECT di.dish_id,
+                           COUNT(h.ingredient_id) > 0 AS covered,
+                           GROUP_CONCAT(i.label, '/') AS label
+                    FROM candidates cd
+                    JOIN dish_ingredients di ON di.dish_id = cd.dish_id
+                    JOIN ingredients i ON i.id = di.ingredient_id
+                    LEFT JOIN have h ON h.ingredient_id = di.ingredient_id
+                    GROUP BY di.dish_id, di.item
+                ),
+                coverage AS (
+                    SELECT dish_id,
+                           COUNT(*) - SUM(covered) AS missing,
+                           GROUP_CONCAT(CASE WHEN NOT covered THEN label END, ', ') AS missing_labels
+                    FROM items
+                    GROUP BY dish_id
+                )
+                SELECT d.id, d.name, d.ingredients, d.instructions, d.category, d.type,
+                       d.image_path, d.thumbnail_path, d.medium_path,
+                       cv.missing, cv.missing_labels AS missing_ingredients
+                FROM coverage cv
+                JOIN dishes d ON d.id = cv.dish_id
+                WHERE cv.missing <= ?
+                ORDER BY cv.missing, d.name
+            ''', (*terms, max_missing))
+            dishes = [dict(row) for row in c.fetchall()]
+            for dish in dishes:
+                missing = dish['missing_ingredients']
+                dish['missing_ingredients'] = missing.split(', ') if missing else []
+            return dishes
+
+    def changes_since(self, version: int = 0) -> Iterator[Tuple[int, int, bool]]:
+        """Stream the dishes added, changed or deleted after a row version, oldest change first.
+
+        Derived data can be kept current by applying these instead of reloading
+        every dish; pass the largest row version seen to the next call.
+
+        Yields:
+            (dish id, row version, deleted) once per dish, for its latest change
+        """
+        # Dishes and tombstones come from one snapshot, so no change is seen twice or missed
+        with self._reader() as conn:
+            c = conn.cursor()
+            c.execute('''
+                SELECT id, row_version, 0 FROM dishes WHERE row_version > ?
+                UNION ALL
+                SELECT dish_id, version, 1 FROM deleted_dishes WHERE version > ?
+                ORDER BY 2
+            ''', (version, version))
+            for dish_id, row_version, deleted in c:
+                yield dish_id, row_version, bool(deleted)
+
+    @synchronized
     def update_dish(self, dish_id: int, name: str, ingredients: str, instructions: str, category: str, type: str, image_data=None) -> bool:
         conn = None
         try:
-            # Get latest database from GitHub if available
+            # Get latest database from GitHub if available, else edit the local copy
             if self.use_github:
-                self._get_db_from_github()
+                try:
+                    self._get_db_from_github()
+                except Exception as e:
+                    # The upload rebases the edit if GitHub has moved on meanwhile
+                    print(f"Warning: Could not refresh database from GitHub: {str(e)}")
             
             conn = self._get_connection()
             c = conn.cursor()
@@ -241,68 +1204,63 @@ class Database:
             # Start transaction
             c.execute("BEGIN TRANSACTION")
             
-            # Get current image path
-            c.execute('SELECT image_path FROM dishes WHERE id = ?', (dish_id,))
-            current_image_path = c.fetchone()[0]
+            # Get current image paths
+            c.execute('SELECT image_path, thumbnail_path, medium_path FROM dishes WHERE id = ?', (dish_id,))
+            current_images = dict(zip(IMAGE_COLUMNS, c.fetchone()))
+            current_image_path = current_images['image_path']
             
             # Handle image update
-            image_path = current_image_path
+            images = current_images
+            files = {}
             if self.use_github:
                 if image_data is None:  # If image_data is None, we want to delete the image
                     if current_image_path:
-                        try:
-                            filename = current_image_path.split('/')[-1]
-                            self.github_service.delete_image(filename)
-                            image_path = None  # Set image_path to None since we deleted the image
-                        except Exception as e:
-                            print(f"Warning: Could not delete image: {str(e)}")
+                        self._prepare_image_delete(c, dish_id, current_images, files)
+                        images = dict.fromkeys(IMAGE_COLUMNS)  # No image left since we deleted it
                 elif image_data != current_image_path:  # Only update if we have new image data
+                    images = self._prepare_image(c, image_data, files)
                     # Delete old image if it exists and is different from the new one
-                    if current_image_path:
-                        try:
-                            filename = current_image_path.split('/')[-1]
-                            self.github_service.delete_image(filename)
-                        except Exception as e:
-                            print(f"Warning: Could not delete old image: {str(e)}")
-                    
-                    # Handle different types of image data
-                    if hasattr(image_data, 'name'):
-                        # File upload object
-                        filename = f"{name}_{image_data.name}"
-                    else:
-                        # For string data (URL or base64), use a generic name
-                        filename = f"{name}_image.png"
-                    image_path = self.github_service.upload_image(image_data, filename)
+                    if current_image_path and current_image_path != images['image_path']:
+                        self._prepare_image_delete(c, dish_id, current_images, files)
             
             # Update the dish
             c.execute('''
                 UPDATE dishes 
-                SET name = ?, ingredients = ?, instructions = ?, category = ?, type = ?, image_path = ?
+                SET name = ?, ingredients = ?, instructions = ?, category = ?, type = ?,
+                    image_path = ?, thumbnail_path = ?, medium_path = ?
                 WHERE id = ?
-            ''', (name, ingredients, instructions, category, type, image_path, dish_id))
+            ''', (name, ingredients, instructions, category, type,
+                  images['image_path'], images['thumbnail_path'], images['medium_path'], dish_id))
+            index_dish_ingredients(c, dish_id, ingredients)
+            index_dish_categories(c, dish_id, category)
             
             # Commit transaction
             conn.commit()
+            self._publish_snapshot()
             
-            # Sync updated database to GitHub if available
+            # Queue the updated database for upload to GitHub if available
             if self.use_github:
-                self._sync_db_to_github()
+                self._record_change(c, 'update', dish_id, files, current_image_path)
+                self._queue_files(files)
+                self.sync_worker.mark_dirty()
             return True
         except Exception as e:
             if conn:
                 conn.rollback()
             print(f"Error updating dish: {str(e)}")
             return False
-        finally:
-            if conn:
-                conn.close()
 
+    @synchronized
     def delete_dish(self, dish_id: int) -> bool:
         conn = None
         try:
-            # Get latest database from GitHub if available
+            # Get latest database from GitHub if available, else edit the local copy
             if self.use_github:
-                self._get_db_from_github()
+                try:
+                    self._get_db_from_github()
+                except Exception as e:
+                    # The upload rebases the edit if GitHub has moved on meanwhile
+                    print(f"Warning: Could not refresh database from GitHub: {str(e)}")
             
             conn = self._get_connection()
             c = conn.cursor()
@@ -310,33 +1268,45 @@ class Database:
             # Start transaction
             c.execute("BEGIN TRANSACTION")
             
-            # Get image path before deleting
-            c.execute('SELECT image_path FROM dishes WHERE id = ?', (dish_id,))
-            image_path = c.fetchone()[0]
+            # Get image paths before deleting
+            c.execute('SELECT image_path, thumbnail_path, medium_path FROM dishes WHERE id = ?', (dish_id,))
+            images = dict(zip(IMAGE_COLUMNS, c.fetchone()))
+            files = {}
+            if self.use_github:
+                self._prepare_image_delete(c, dish_id, images, files)
             
             # Delete the dish
             c.execute('DELETE FROM dishes WHERE id = ?', (dish_id,))
             
             # Commit transaction
             conn.commit()
+            self._publish_snapshot()
             
-            # Delete image from GitHub if available
-            if self.use_github and image_path:
-                try:
-                    filename = image_path.split('/')[-1]
-                    self.github_service.delete_image(filename)
-                except Exception as e:
-                    print(f"Warning: Could not delete image: {str(e)}")
-            
-            # Sync updated database to GitHub if available
+            # Queue the image removal and updated database for upload to GitHub if available
             if self.use_github:
-                self._sync_db_to_github()
+                self._record_change(c, 'delete', dish_id, files, images['image_path'])
+                self._queue_files(files)
+                self.sync_worker.mark_dirty()
             return True
         except Exception as e:
             if conn:
                 conn.rollback()
             print(f"Error deleting dish: {str(e)}")
             return False
-        finally:
-            if conn:
-                conn.close() 
\ No newline at end of file
+
+
+@st.cache_resource
+def _load_database() -> Database:
+    return Database()
+
+def get_database() -> Database:
+    """Get the Database shared by all sessions and reruns of this server process.
+
+    Pages call this once per run, which starts the run's GitHub API call budget
+    and shows any problem met while the database was loaded.
+    """
+    db = _load_database()
+    db.start_render()
+    if db.startup_warning:
+        st.warning(db.startup_warning)
+    return db
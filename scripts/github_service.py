@@ -1,10 +1,72 @@
 import os
 import base64
+import threading
+import time
+import urllib.parse
+from concurrent.futures import Future, ThreadPoolExecutor
+import requests
 import streamlit as st
-from github import Github
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import MaxRetryError, ResponseError
+from github import Github, GithubException, GithubRetry, InputGitTreeElement, UnknownObjectException
+from github.ContentFile import ContentFile
+from github.GitCommit import GitCommit
+from github.GitTree import GitTree
+
+# Bytes per read when streaming large files from GitHub
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+# Concurrent GitHub requests per service
+DEFAULT_MAX_WORKERS = 4
+# Retries of 5xx and rate-limited requests, with exponential backoff and random jitter (seconds)
+RETRY_ATTEMPTS = 5
+RETRY_BACKOFF = 0.5
+RETRY_JITTER = 0.5
+# Longest wait before one retry; rate limits lasting longer fail fast so callers use their cached copy
+RETRY_MAX_WAIT = 5.0
+# API calls one page render may make before falling back to the cached copy
+DEFAULT_RENDER_BUDGET = 5
+# Below this many remaining calls per hour, reads use the cached copy so writes still go through
+QUOTA_RESERVE = 100
+
+class ConflictError(Exception):
+    """A file changed on GitHub since the version a commit was based on."""
+
+class BoundedRetry(GithubRetry):
+    """GithubRetry that gives up instead of waiting longer than RETRY_MAX_WAIT.
+
+    GithubRetry waits out a primary rate limit until the quota resets, which can
+    be up to an hour, and a secondary one for as long as Retry-After asks.
+    Either would stall the page or sync that made the request.
+    """
+
+    def __init__(self, on_retry=None, **kwargs):
+        """
+        Args:
+            on_retry: Called before each request is sent again, so it can be counted
+        """
+        self.on_retry = on_retry
+        super().__init__(**kwargs)
+
+    def new(self, **kw):
+        kw.update(on_retry=self.on_retry)
+        return super().new(**kw)
+
+    def sleep(self, response=None):
+        wait = self.get_backoff_time()
+        if response is not None and self.respect_retry_after_header:
+            wait = max(wait, self.get_retry_after(response) or 0)
+        if wait > RETRY_MAX_WAIT:
+            raise MaxRetryError(None, response.geturl() if response is not None else None,
+                                ResponseError(f"rate limited for {wait:.0f}s"))
+        super().sleep(response)
+        if self.on_retry is not None:
+            self.on_retry()
 
 class GitHubService:
-    def __init__(self):
+    # Returned by fetch_file when the remote file matches the last known copy
+    UNCHANGED = object()
+
+    def __init__(self, max_workers=DEFAULT_MAX_WORKERS):
         # Get secrets from Streamlit
         self.github_token = st.secrets["github"]["token"]
         self.repo_name = st.secrets["github"]["repo"]
@@ -13,141 +75,344 @@ class GitHubService:
         if not all([self.github_token, self.repo_name, self.owner]):
             raise ValueError("Missing GitHub configuration. Please set github.token, github.repo, and github.owner in Streamlit secrets")
         
-        self.github = Github(self.github_token)
+        # API call budget of the page render running on each thread
+        self._render = threading.local()
+        # Updated from page renders, the sync worker and the pool at once
+        self._counters_lock = threading.Lock()
+        self._counters = {'api_calls': 0, 'deduplicated': 0, 'budget_fallbacks': 0}
+
+        # Backs off on 5xx errors and short rate limits (403/429), never for long
+        retry = BoundedRetry(on_retry=self._count_calls, total=RETRY_ATTEMPTS, backoff_factor=RETRY_BACKOFF,
+                             backoff_jitter=RETRY_JITTER, backoff_max=RETRY_MAX_WAIT,
+                             secondary_rate_wait=RETRY_MAX_WAIT)
+        self.github = Github(self.github_token, retry=retry)
+        # Raw blob downloads bypass PyGithub, so give them the same retries
+        self._session = requests.Session()
+        self._session.mount("https://", HTTPAdapter(max_retries=retry))
+        # Looking up the user, then the repository
+        self._count_calls(2)
         self.repo = self.github.get_user(self.owner).get_repo(self.repo_name)
-        
-    def upload_image(self, image_data, filename):
-        try:
-            # Handle file-like objects (e.g., from st.file_uploader)
-            if hasattr(image_data, 'read'):
-                content = image_data.read()
-            # Handle bytes objects
-            elif isinstance(image_data, bytes):
-                content = image_data
-            # Handle string inputs
-            elif isinstance(image_data, str):
-                if image_data.startswith('data:image'):
-                    # Base64 image data with data URL prefix
-                    content = base64.b64decode(image_data.split(',')[1])
-                elif image_data.startswith('http'):
-                    # If it's a URL, return it directly
-                    return image_data
-                elif image_data.startswith('iVBORw0KGgoAAAANSUhEUg'):  # Common base64 PNG header
-                    # Raw base64 string without data URL prefix
-                    content = base64.b64decode(image_data)
-                else:
-                    # Try to decode as base64
-                    try:
-                        content = base64.b64decode(image_data)
-                    except:
-                        raise ValueError("Invalid image data format")
-            else:
-                raise ValueError("Unsupported image data type. Please provide a file, bytes, or string.")
 
-            # Create path in images directory for GitHub
-            path = f"images/{filename}"
+        # Blob SHA and ETag of the last copy fetched or pushed, keyed by path
+        self._file_shas = {}
+        self._file_etags = {}
+        # (blob SHA, ETag) of the last copy fetched but not yet in use, keyed by path
+        self._fetched = {}
+        # (commit SHA, tree SHA) of main as of our last commit, and a lock for updating it
+        self._head = None
+        self._commit_lock = threading.Lock()
+        # Bounded pool for GitHub requests that don't depend on each other
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="github")
+        # GETs in progress, so concurrent identical requests share one response
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
 
-            try:
-                # Try to get existing file to get its SHA
-                contents = self.repo.get_contents(path)
-                # Update existing file
-                self.repo.update_file(
-                    path=path,
-                    message=f"Update image: {filename}",
-                    content=content,  # <-- Pass bytes, NOT base64 string
-                    sha=contents.sha,
-                    branch="main"
-                )
-            except Exception:
-                # File doesn't exist, create new file
-                self.repo.create_file(
-                    path=path,
-                    message=f"Add image: {filename}",
-                    content=content,  # <-- Pass bytes, NOT base64 string
-                    branch="main"
-                )
+    def start_render(self, budget=DEFAULT_RENDER_BUDGET):
+        """Start a fresh API call budget for the page render on the current thread."""
+        self._render.budget = budget
 
-            # Return the raw URL for the image
-            return f"https://raw.githubusercontent.com/{self.owner}/{self.repo_name}/main/{path}"
+    def _increment(self, counter, amount=1):
+        """Add to a call counter."""
+        with self._counters_lock:
+            self._counters[counter] += amount
 
-        except Exception as e:
-            st.error(f"Error uploading image to GitHub: {str(e)}")
-            raise
+    def _count_calls(self, calls=1):
+        """Count API requests about to be sent against the current render's budget.
 
-    def delete_image(self, filename):
-        """Delete an image from GitHub repository."""
-        try:
-            path = f"images/{filename}"
-            contents = self.repo.get_contents(path)
-            self.repo.delete_file(
-                path=path,
-                message=f"Delete image: {filename}",
-                sha=contents.sha,
-                branch="main"
-            )
-            return True
-        except Exception as e:
-            st.error(f"Error deleting image from GitHub: {str(e)}")
+        Every request is counted, reads and writes alike. Writes are never
+        refused, but they use up the budget, so the render's later conditional
+        reads fall back to the copies already known.
+        """
+        self._increment('api_calls', calls)
+        budget = getattr(self._render, 'budget', None)
+        if budget is not None:
+            self._render.budget = budget - calls
+
+    def _can_spend(self):
+        """Check whether the current render may send an optional API request.
+
+        Returns:
+            False when the render is out of budget or the quota is nearly used up
+        """
+        budget = getattr(self._render, 'budget', None)
+        if budget is not None and budget <= 0:
+            return False
+        remaining, _ = self.repo._requester.rate_limiting
+        if 0 <= remaining < QUOTA_RESERVE and self.repo._requester.rate_limiting_resettime > time.time():
             return False
-            
+        return True
+
+    def _shared_get(self, key, fetch):
+        """Run a GET once for every caller asking for the same thing at the same time."""
+        with self._inflight_lock:
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight[key] = Future()
+        if not owner:
+            self._increment('deduplicated')
+            return future.result()
+        try:
+            result = fetch()
+            future.set_result(result)
+            return result
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._inflight_lock:
+                del self._inflight[key]
+
+    def stats(self):
+        """Get the remaining API quota and call counters."""
+        remaining, limit = self.repo._requester.rate_limiting
+        reset_at = self.repo._requester.rate_limiting_resettime
+        return {
+            'remaining': remaining if remaining >= 0 else None,
+            'limit': limit if limit >= 0 else None,
+            'reset_at': reset_at or None,
+            **self._counter_values(),
+        }
+
+    def _counter_values(self):
+        """Get a consistent copy of the call counters."""
+        with self._counters_lock:
+            return dict(self._counters)
+
+    def submit(self, fn, *args, **kwargs):
+        """Run an independent GitHub operation on the worker pool.
+
+        Returns:
+            A Future with the result, so callers only wait where ordering matters
+        """
+        return self._executor.submit(fn, *args, **kwargs)
+
+    def close(self):
+        """Stop the worker pool once nothing submits to it anymore."""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def get_image_bytes(self, image_data):
+        """Get the raw bytes of an image given as a file, bytes or base64 string."""
+        # Handle file-like objects (e.g., from st.file_uploader)
+        if hasattr(image_data, 'read'):
+            return image_data.read()
+        # Handle bytes objects
+        if isinstance(image_data, bytes):
+            return image_data
+        # Handle string inputs
+        if isinstance(image_data, str):
+            if image_data.startswith('data:image'):
+                # Base64 image data with data URL prefix
+                return base64.b64decode(image_data.split(',')[1])
+            if image_data.startswith('iVBORw0KGgoAAAANSUhEUg'):  # Common base64 PNG header
+                # Raw base64 string without data URL prefix
+                return base64.b64decode(image_data)
+            # Try to decode as base64
+            try:
+                return base64.b64decode(image_data)
+            except:
+                raise ValueError("Invalid image data format")
+        raise ValueError("Unsupported image data type. Please provide a file, bytes, or string.")
+        
     def get_image_url(self, filename):
         """Get the raw URL for an image."""
         return f"https://raw.githubusercontent.com/{self.owner}/{self.repo_name}/main/images/{filename}"
 
-    def upload_file(self, content, filename, message="Update file"):
-        """Upload a file to GitHub repository.
-        
+    def _get_head(self):
+        """Get the (commit SHA, tree SHA) of main, fetching it only when not cached."""
+        if self._head is None:
+            self._count_calls(2)
+            ref = self.repo.get_git_ref("heads/main")
+            commit = self.repo.get_git_commit(ref.object.sha)
+            self._head = (commit.sha, commit.tree.sha)
+        return self._head
+
+    def _check_shas(self, ref, expected_shas):
+        """Raise ConflictError unless each file at a commit is the expected blob (None: absent)."""
+        for path, expected in expected_shas.items():
+            self._count_calls()
+            try:
+                _, data = self.repo._requester.requestJsonAndCheck(
+                    "GET",
+                    f"{self.repo.url}/contents/{urllib.parse.quote(path)}",
+                    parameters={"ref": ref}
+                )
+                sha = data["sha"]
+            except UnknownObjectException:
+                sha = None
+            if sha != expected:
+                raise ConflictError(f"{path} changed on GitHub since it was last pulled")
+
+    def commit_files(self, files, message="Update files", expected_shas=None):
+        """Commit several file changes to main as a single commit.
+
+        Builds one tree from all blobs and moves main with a single ref update,
+        so either every change lands or none does.
+
         Args:
-            content: The content to upload (base64 encoded string)
-            filename: The name to save the file as
+            files: Mapping of repository path to new content (bytes), or None to delete the file
             message: Commit message
+            expected_shas: Mapping of path to the blob SHA (or None for no file) it must
+                still have on main; the commit is refused with ConflictError otherwise
+
+        Returns:
+            Mapping of path to blob SHA for every file written
         """
         try:
-            # Create path in root directory
-            path = filename
-            
-            try:
-                # Try to get existing file to get its SHA
-                contents = self.repo.get_contents(path)
-                # Update existing file
-                self.repo.update_file(
-                    path=path,
-                    message=message,
-                    content=content,
-                    sha=contents.sha,
-                    branch="main"
-                )
-            except Exception as e:
-                if "Not Found" in str(e):
-                    # File doesn't exist, create new file
-                    self.repo.create_file(
-                        path=path,
-                        message=message,
-                        content=content,
-                        branch="main"
+            # Blobs don't depend on each other, so upload them in parallel
+            self._count_calls(sum(content is not None for content in files.values()))
+            blob_futures = {
+                path: self.submit(self.repo.create_git_blob, base64.b64encode(content).decode('utf-8'), "base64")
+                for path, content in files.items() if content is not None
+            }
+            elements = []
+            blob_shas = {}
+            for path, content in files.items():
+                if content is None:
+                    # A null SHA removes the path from the tree
+                    elements.append(InputGitTreeElement(path, "100644", "blob", sha=None))
+                    continue
+                blob_shas[path] = blob_futures[path].result().sha
+                elements.append(InputGitTreeElement(path, "100644", "blob", sha=blob_shas[path]))
+
+            with self._commit_lock:
+                for attempt in range(2):
+                    # Our own last commit holds the expected files; any other head is checked
+                    fetched = self._head is None
+                    head_sha, tree_sha = self._get_head()
+                    if fetched and expected_shas:
+                        self._check_shas(head_sha, expected_shas)
+                    requester = self.repo._requester
+                    # Tree, commit and ref update
+                    self._count_calls(3)
+                    tree = self.repo.create_git_tree(
+                        elements, base_tree=GitTree(requester, {}, {"sha": tree_sha}, completed=False)
+                    )
+                    commit = self.repo.create_git_commit(
+                        message, tree, [GitCommit(requester, {}, {"sha": head_sha}, completed=False)]
                     )
-                else:
-                    # Re-raise if it's a different error
-                    raise
-            
-            return True
-            
+                    try:
+                        # Fast-forward only, so a concurrent push is never discarded
+                        requester.requestJsonAndCheck(
+                            "PATCH",
+                            f"{self.repo.url}/git/refs/heads/main",
+                            input={"sha": commit.sha, "force": False}
+                        )
+                    except GithubException as e:
+                        if e.status == 422 and attempt == 0:
+                            # Cached head is stale, rebuild on top of the current one
+                            self._head = None
+                            continue
+                        raise
+                    self._head = (commit.sha, tree.sha)
+                    break
+
+            for path, sha in blob_shas.items():
+                self._file_shas[path] = sha
+                self._file_etags.pop(path, None)
+            return blob_shas
+        except ConflictError:
+            # The caller resolves conflicts
+            raise
         except Exception as e:
-            st.error(f"Error uploading file to GitHub: {str(e)}")
+            # Called from the sync worker and while the shared Database is built,
+            # where st.* messages would be lost or replayed to every session
+            print(f"Error committing files to GitHub: {str(e)}")
             raise
 
-    def get_file_content(self, filename):
-        """Get the content of a file from GitHub repository.
-        
+    def _stream_blob(self, sha, fileobj):
+        """Stream the raw content of a blob into a binary file object in chunks."""
+        self._count_calls()
+        response = self._session.get(
+            f"{self.repo.url}/git/blobs/{sha}",
+            headers={
+                "Authorization": f"token {self.github_token}",
+                "Accept": "application/vnd.github.raw"
+            },
+            stream=True,
+            timeout=60
+        )
+        with response:
+            response.raise_for_status()
+            for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                fileobj.write(chunk)
+
+    def _get_contents(self, path, if_changed=False):
+        """Get the metadata (and inline content for small files) of a file.
+
+        Returns:
+            A (ContentFile, ETag) pair, or UNCHANGED when the conditional request
+            or the blob SHA shows the last copy fetched or pushed is current.
+            UNCHANGED is also returned without asking GitHub when a copy is known
+            but the render's call budget or the API quota has run out.
+        """
+        if not self._can_spend() and if_changed and path in self._file_shas:
+            self._increment('budget_fallbacks')
+            return self.UNCHANGED
+
+        headers = {}
+        etag = self._file_etags.get(path)
+        if if_changed and etag:
+            headers["If-None-Match"] = etag
+
+        url = f"{self.repo.url}/contents/{urllib.parse.quote(path)}"
+        def fetch():
+            self._count_calls()
+            return self.repo._requester.requestJsonAndCheck("GET", url, headers=headers)
+
+        response_headers, data = self._shared_get(("contents", url, etag if if_changed else None), fetch)
+        # 304 Not Modified comes back without a body
+        if data is None:
+            return self.UNCHANGED
+
+        contents = ContentFile(self.repo._requester, response_headers, data, completed=True)
+        if if_changed and contents.sha == self._file_shas.get(path):
+            self._file_etags[path] = response_headers.get("etag")
+            return self.UNCHANGED
+        return contents, response_headers.get("etag")
+
+    def known_sha(self, filename):
+        """Get the blob SHA of the last copy of a file fetched or pushed, or None."""
+        return self._file_shas.get(filename)
+
+    def forget_file(self, filename):
+        """Drop the remembered version of a file so the next fetch downloads it again."""
+        self._file_shas.pop(filename, None)
+        self._file_etags.pop(filename, None)
+
+    def fetch_file(self, filename, fileobj, if_changed=False):
+        """Write the raw bytes of a file into a binary file object without remembering its version.
+
+        For callers that may still discard the copy: once it is in use, pass the
+        returned SHA to remember_file so that conditional requests and
+        expected_shas compare against it. Errors are raised without being shown.
+
         Args:
             filename: The name of the file to get
+            fileobj: Binary file object to write the content to
+            if_changed: Send a conditional request and return UNCHANGED if the
+                remote file matches the copy in use
+
+        Returns:
+            The blob SHA written, None if the file does not exist, or UNCHANGED
         """
+        path = filename
         try:
-            path = filename
-            contents = self.repo.get_contents(path)
-            return contents.decoded_content.decode('utf-8')
-        except Exception as e:
-            if "Not Found" in str(e):
-                return None
-            st.error(f"Error getting file from GitHub: {str(e)}")
-            raise 
\ No newline at end of file
+            result = self._get_contents(path, if_changed)
+        except UnknownObjectException:
+            return None
+        if result is self.UNCHANGED:
+            return self.UNCHANGED
+        contents, etag = result
+        if contents.encoding == "base64":
+            fileobj.write(contents.decoded_content)
+        else:
+            self._stream_blob(contents.sha, fileobj)
+        self._fetched[path] = (contents.sha, etag)
+        return contents.sha
+
+    def remember_file(self, filename, sha):
+        """Record a copy returned by fetch_file as the version in use."""
+        fetched_sha, etag = self._fetched.pop(filename, (None, None))
+        self._file_etags[filename] = etag if fetched_sha == sha else None
+        self._file_shas[filename] = sha
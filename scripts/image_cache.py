@@ -0,0 +1,179 @@
+"""Server-side cache of decoded, resized recipe images.
+
+display_image() would otherwise hand GitHub URLs to the browser or decode base64
+images again on every rerun. The cache keeps the ready-to-serve bytes on disk,
+bounded in size with least-recently-used eviction, plus a small in-memory tier
+for the hottest entries.
+"""
+import base64
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from io import BytesIO
+from typing import Any, Dict, Optional
+import requests
+from PIL import Image, ImageOps
+
+DEFAULT_CACHE_DIR = os.path.join(".cache", "images")
+DEFAULT_MAX_DISK_BYTES = 200 * 1024 * 1024
+DEFAULT_MAX_MEMORY_BYTES = 32 * 1024 * 1024
+# Widest image worth sending for the two-column recipe grid
+DEFAULT_DISPLAY_WIDTH = 800
+
+class ImageCache:
+    """Two-tier (memory, then disk) LRU cache of display-ready image bytes."""
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, max_disk_bytes: int = DEFAULT_MAX_DISK_BYTES,
+                 max_memory_bytes: int = DEFAULT_MAX_MEMORY_BYTES):
+        self.cache_dir = cache_dir
+        self.max_disk_bytes = max_disk_bytes
+        self.max_memory_bytes = max_memory_bytes
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        self._memory_bytes = 0
+        self._counters = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'evictions': 0}
+
+        os.makedirs(cache_dir, exist_ok=True)
+        # Rebuild the disk LRU order from access times left by earlier runs
+        entries = []
+        for name in os.listdir(cache_dir):
+            path = os.path.join(cache_dir, name)
+            if os.path.isfile(path):
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, name, stat.st_size))
+        self._disk = OrderedDict((name, size) for _, name, size in sorted(entries))
+        self._disk_bytes = sum(self._disk.values())
+
+    def get(self, source: str, width: Optional[int] = DEFAULT_DISPLAY_WIDTH) -> bytes:
+        """Get the display bytes of an image, loading and resizing it on first use.
+
+        Args:
+            source: URL, base64 string (with or without data URL prefix) or file path
+            width: Largest width to serve, None to keep the original size
+        """
+        key = hashlib.sha256(f"{width}:{source}{self._file_version(source)}".encode()).hexdigest()
+        with self._lock:
+            content = self._memory.get(key)
+            if content is not None:
+                self._memory.move_to_end(key)
+                self._counters['memory_hits'] += 1
+                return content
+            if key in self._disk:
+                try:
+                    content = self._read_disk(key)
+                    self._counters['disk_hits'] += 1
+                    self._remember(key, content)
+                    return content
+                except OSError:
+                    # Removed behind our back; treat it as a miss
+                    self._forget_disk(key)
+            self._counters['misses'] += 1
+
+        # Load outside the lock so a slow download doesn't block cached images
+        content = self._render(self._load(source), width)
+        with self._lock:
+            self._write_disk(key, content)
+            self._remember(key, content)
+        return content
+
+    def stats(self) -> Dict[str, Any]:
+        """Get hit and miss counters and the current size of each tier."""
+        with self._lock:
+            lookups = sum(self._counters[name] for name in ('memory_hits', 'disk_hits', 'misses'))
+            hits = self._counters['memory_hits'] + self._counters['disk_hits']
+            return {
+                **self._counters,
+                'hit_rate': hits / lookups if lookups else 0.0,
+                'memory_entries': len(self._memory),
+                'memory_bytes': self._memory_bytes,
+                'disk_entries': len(self._disk),
+                'disk_bytes': self._disk_bytes,
+            }
+
+    @staticmethod
+    def _file_version(source: str) -> str:
+        """Get a suffix that changes whenever a local image file does, '' for other sources."""
+        if source.startswith(('data:image', 'http', 'iVBORw0KGgoAAAANSUhEUg')):
+            return ''
+        try:
+            stat = os.stat(source)
+        except (OSError, ValueError):
+            # Not a file; _load reports the problem
+            return ''
+        # Images replaced in place keep their path, so the key must not rely on it alone
+        return f":{stat.st_mtime_ns}:{stat.st_size}"
+
+    @staticmethod
+    def _load(source: str) -> bytes:
+        if source.startswith('data:image'):
+            # Base64 image data with data URL prefix
+            return base64.b64decode(source.split(',')[1])
+        if source.startswith('http'):
+            response = requests.get(source, timeout=30)
+            response.raise_for_status()
+            return response.content
+        if source.startswith('iVBORw0KGgoAAAANSUhEUg'):  # Common base64 PNG header
+            return base64.b64decode(source)
+        with open(source, 'rb') as f:
+            return f.read()
+
+    @staticmethod
+    def _render(content: bytes, width: Optional[int]) -> bytes:
+        """Shrink an image to the display width, keeping its format when possible."""
+        with Image.open(BytesIO(content)) as image:
+            if width is None or image.width <= width:
+                return content
+            image_format = image.format or 'PNG'
+            resized = ImageOps.exif_transpose(image)
+            resized.thumbnail((width, width * 4), Image.LANCZOS)
+            if image_format == 'JPEG' and resized.mode not in ('RGB', 'L'):
+                resized = resized.convert('RGB')
+            buffer = BytesIO()
+            resized.save(buffer, image_format, quality=85)
+            return buffer.getvalue()
+
+    def _remember(self, key: str, content: bytes):
+        if len(content) > self.max_memory_bytes:
+            return
+        self._memory[key] = content
+        self._memory_bytes += len(content)
+        while self._memory_bytes > self.max_memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+
+    def _read_disk(self, key: str) -> bytes:
+        path = os.path.join(self.cache_dir, key)
+        with open(path, 'rb') as f:
+            content = f.read()
+        # The file's mtime records recency across restarts
+        os.utime(path)
+        self._disk.move_to_end(key)
+        return content
+
+    def _write_disk(self, key: str, content: bytes):
+        path = os.path.join(self.cache_dir, key)
+        tmp_path = f"{path}.tmp"
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"Warning: Could not write image cache entry: {str(e)}")
+            return
+        self._forget_disk(key)
+        self._disk[key] = len(content)
+        self._disk_bytes += len(content)
+        while self._disk_bytes > self.max_disk_bytes and len(self._disk) > 1:
+            evicted = next(iter(self._disk))
+            self._forget_disk(evicted)
+            try:
+                os.remove(os.path.join(self.cache_dir, evicted))
+            except OSError:
+                pass
+            self._counters['evictions'] += 1
+
+    def _forget_disk(self, key: str):
+        size = self._disk.pop(key, None)
+        if size is not None:
+            self._disk_bytes -= size
@@ -0,0 +1,97 @@
+"""Resolve stored image paths to the local checkout of the images/ directory.
+
+Dishes store raw.githubusercontent.com URLs, but the app runs from a checkout
+of the same repository. Images that are already on disk are read from there
+instead of being fetched over the internet, and only missing ones (such as
+uploads made since the last pull) fall back to the remote URL.
+
+With Streamlit's static file serving enabled (server.enableStaticServing),
+local images are resized for display and served from /app/static/ with a
+version argument, which makes the server send long-lived cache headers so
+browsers don't request them again.
+"""
+import os
+import re
+import urllib.parse
+from typing import Callable, Optional
+import streamlit as st
+
+IMAGES_DIR = "images"
+# Streamlit serves ./static next to the main script under app/static
+STATIC_DIR = "static"
+STATIC_URL = "app/static"
+# Raw URLs of files under images/ in any repository and branch
+RAW_IMAGE_URL = re.compile(r"^https://raw\.githubusercontent\.com/[^/]+/[^/]+/[^/]+/images/(.+)$")
+
+class ImageResolver:
+    def __init__(self, images_dir: str = IMAGES_DIR, static_dir: str = STATIC_DIR, static_serving: Optional[bool] = None):
+        self.images_dir = images_dir
+        self.static_dir = static_dir
+        if static_serving is None:
+            static_serving = bool(st.get_option("server.enableStaticServing"))
+        self.static_serving = static_serving
+
+    def local_path(self, image_path: str) -> Optional[str]:
+        """Get the local file of a stored image path, or None if it isn't on disk."""
+        match = RAW_IMAGE_URL.match(image_path)
+        if match:
+            relative = urllib.parse.unquote(match.group(1))
+            path = os.path.normpath(os.path.join(self.images_dir, relative))
+            # Never resolve outside the images directory
+            if os.path.commonpath([path, os.path.normpath(self.images_dir)]) != os.path.normpath(self.images_dir):
+                return None
+        elif image_path.startswith(('http', 'data:')) or len(image_path) > 1024:
+            # Other URLs and inline base64 data have no local copy
+            return None
+        else:
+            path = image_path
+        return path if os.path.isfile(path) else None
+
+    def resolve(self, image_path: str) -> str:
+        """Get the local file of a stored image path, falling back to the path itself."""
+        return self.local_path(image_path) or image_path
+
+    def static_url(self, image_path: str, render: Callable[[str], bytes]) -> Optional[str]:
+        """Get a cacheable static URL for a local image, or None when static serving is off.
+
+        Static files must live under static/, so the display version of a local
+        image is written there on first use. Originals are never served as
+        they are, since photos straight from a phone run to several megabytes.
+
+        Args:
+            image_path: Stored image path
+            render: Produces the bytes to serve from the local file, such as ImageCache.get
+        """
+        if not self.static_serving:
+            return None
+        path = self.local_path(image_path)
+        if path is None:
+            return None
+        relative = os.path.relpath(path, self.images_dir)
+        if relative.startswith('..'):
+            return None
+        
+        served_path = os.path.join(self.static_dir, IMAGES_DIR, relative)
+        stat = os.stat(path)
+        try:
+            # The served file takes the original's modification time when written
+            stale = os.stat(served_path).st_mtime_ns != stat.st_mtime_ns
+        except FileNotFoundError:
+            stale = True
+        if stale:
+            try:
+                os.makedirs(os.path.dirname(served_path), exist_ok=True)
+                tmp_path = f"{served_path}.tmp"
+                with open(tmp_path, 'wb') as f:
+                    f.write(render(path))
+                os.utime(tmp_path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+                os.replace(tmp_path, served_path)
+            except OSError as e:
+                print(f"Warning: Could not publish {path} for static serving: {str(e)}")
+                return None
+
+        # The version argument turns on far-future Cache-Control headers; it
+        # changes whenever the file does, so browsers never keep a stale copy
+        version = f"{stat.st_mtime_ns:x}{stat.st_size:x}"
+        quoted = urllib.parse.quote(f"{IMAGES_DIR}/{relative.replace(os.sep, '/')}")
+        return f"{STATIC_URL}/{quoted}?v={version}"
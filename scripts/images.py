@@ -0,0 +1,67 @@
+"""Resized variants of recipe photos.
+
+Phone photos are several megabytes, so every uploaded image also gets a small
+thumbnail for the recipe grid and a medium variant for detail views. Variants
+are stored next to the original under images/thumbnails/ and images/medium/.
+New images are named by a hash of their content; the image_files table maps
+those names back to the original file names.
+"""
+import hashlib
+import os
+from io import BytesIO
+from typing import Dict
+from PIL import Image, ImageOps, features
+
+# Longest side in pixels of each variant, keyed by its dishes column
+VARIANT_SIZES = {
+    'thumbnail_path': 400,
+    'medium_path': 1200,
+}
+# Subdirectory of images/ that holds each variant
+VARIANT_DIRS = {
+    'thumbnail_path': 'thumbnails',
+    'medium_path': 'medium',
+}
+VARIANT_QUALITY = 80
+# WebP is much smaller; fall back to JPEG when Pillow was built without it
+VARIANT_FORMAT = 'WEBP' if features.check('webp') else 'JPEG'
+VARIANT_EXTENSION = '.webp' if VARIANT_FORMAT == 'WEBP' else '.jpg'
+# Hex digits of the SHA-256 used in content-addressed image names
+CONTENT_HASH_LENGTH = 32
+
+def content_filename(content: bytes, original_name: str) -> str:
+    """Get the content-addressed name of an image, keeping its original extension.
+
+    Identical photos get the same name however they were named on upload,
+    so they are stored once.
+    """
+    extension = os.path.splitext(original_name)[1].lower() or '.png'
+    return f"{hashlib.sha256(content).hexdigest()[:CONTENT_HASH_LENGTH]}{extension}"
+
+def variant_filename(filename: str, column: str) -> str:
+    """Get the name, relative to images/, of a variant of an original image."""
+    stem = os.path.splitext(filename)[0]
+    return f"{VARIANT_DIRS[column]}/{stem}{VARIANT_EXTENSION}"
+
+def make_variants(content: bytes) -> Dict[str, bytes]:
+    """Create size-capped variants of an image, keyed by their dishes column.
+
+    The EXIF orientation is applied to the pixels, since the variants carry
+    no EXIF data and would otherwise show phone photos sideways.
+    """
+    with Image.open(BytesIO(content)) as original:
+        image = ImageOps.exif_transpose(original)
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'transparency' in image.info or 'A' in image.getbands() else 'RGB')
+        if VARIANT_FORMAT == 'JPEG' and image.mode == 'RGBA':
+            image = image.convert('RGB')
+
+        variants = {}
+        for column, size in VARIANT_SIZES.items():
+            variant = image.copy()
+            # Only ever shrink; thumbnail() keeps the aspect ratio
+            variant.thumbnail((size, size), Image.LANCZOS)
+            buffer = BytesIO()
+            variant.save(buffer, VARIANT_FORMAT, quality=VARIANT_QUALITY)
+            variants[column] = buffer.getvalue()
+        return variants
@@ -0,0 +1,92 @@
+"""Parsing of free-text ingredient lists into normalized, searchable terms.
+
+Ingredients are stored on dishes as free text such as
+"3x vejce, mléko, polohrubá/hladká mouka + nutella". At write time each dish's
+text is split into items, and items such as "polohrubá/hladká mouka" into
+alternatives that can replace each other. Every word is lowercased, stripped of
+diacritics and reduced by a simple Czech suffix folding, and the resulting
+terms are recorded in the ingredients / dish_ingredients tables, grouped by item.
+"""
+import re
+import unicodedata
+from typing import List, Tuple
+
+# Characters and conjunctions that separate ingredient items
+_ITEM_SEPARATORS = re.compile(r"[,;\n+()]|\s(?:a|i)\s")
+# Separators of alternatives within one item ("polohrubá/hladká mouka")
+_ALTERNATIVE_SEPARATORS = re.compile(r"/|\s(?:nebo)\s")
+# Filler words, prepositions and units that never name an ingredient
+_STOPWORDS = {
+    'a', 'i', 'o', 's', 'se', 'z', 'ze', 'v', 've', 'na', 'do', 'k', 'ke', 'od', 'po', 'pro', 'nebo',
+    'x', 'g', 'kg', 'dkg', 'ml', 'dl', 'l', 'ks', 'kus', 'kusy', 'lzice', 'lzicka', 'lzicky',
+    'hrnek', 'hrnky', 'spetka', 'trochu', 'dle', 'chuti', 'optional', 'volitelne',
+}
+# Czech inflection endings, longest first, folded to a shared stem
+_SUFFIXES = ('ami', 'emi', 'ech', 'ich', 'ovy', 'ova', 'ove', 'ou', 'em', 'ek', 'y', 'e', 'i', 'a', 'u', 'o')
+
+def fold(text: str) -> str:
+    """Lowercase text and strip diacritics ("Kaše" -> "kase")."""
+    decomposed = unicodedata.normalize('NFKD', text.lower())
+    return ''.join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+def stem(word: str) -> str:
+    """Fold a Czech word form to a simple stem ("brambory", "bramborami" -> "brambor")."""
+    for suffix in _SUFFIXES:
+        # Keep at least three letters so short words aren't mangled
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[:-len(suffix)]
+    return word
+
+def normalize_term(text: str) -> str:
+    """Normalize one ingredient (or pantry item) into its indexed form."""
+    words = re.findall(r"[^\W\d_]+", fold(text))
+    return ' '.join(stem(word) for word in words if word not in _STOPWORDS)
+
+def split_alternatives(item: str) -> List[str]:
+    """Split an item into the alternatives any of which will do.
+
+    A lone adjective shares the noun of the last alternative, so
+    "polohrubá/hladká mouka" means "polohrubá mouka" or "hladká mouka".
+    """
+    alternatives = [part.strip() for part in _ALTERNATIVE_SEPARATORS.split(item) if part.strip()]
+    if len(alternatives) > 1:
+        last = alternatives[-1].split()
+        if len(last) > 1:
+            alternatives = [
+                f"{alternative} {' '.join(last[1:])}" if len(alternative.split()) == 1 else alternative
+                for alternative in alternatives[:-1]
+            ] + alternatives[-1:]
+    return alternatives
+
+def parse_ingredients(text: str) -> List[List[Tuple[str, str]]]:
+    """Split an ingredient list into distinct items, in order.
+
+    Returns:
+        For each item, its alternatives as (normalized term, display label) pairs
+    """
+    ingredients = []
+    seen = set()
+    for item in _ITEM_SEPARATORS.split(text or ''):
+        alternatives = []
+        for alternative in split_alternatives(item):
+            term = normalize_term(alternative)
+            if term and term not in (known for known, _ in alternatives):
+                # Drop quantities like "3x" from the label shown to users
+                label = re.sub(r"^\s*\d+\s*x?\s*", '', alternative.lower())
+                alternatives.append((term, label))
+        terms = frozenset(term for term, _ in alternatives)
+        if terms and terms not in seen:
+            seen.add(terms)
+            ingredients.append(alternatives)
+    return ingredients
+
+def index_dish_ingredients(c, dish_id: int, text: str):
+    """Replace the indexed ingredients of a dish with those parsed from its text."""
+    c.execute('DELETE FROM dish_ingredients WHERE dish_id = ?', (dish_id,))
+    for item, alternatives in enumerate(parse_ingredients(text)):
+        for term, label in alternatives:
+            c.execute('INSERT OR IGNORE INTO ingredients (name, label) VALUES (?, ?)', (term, label))
+            c.execute('''
+                INSERT OR IGNORE INTO dish_ingredients (dish_id, item, ingredient_id)
+                SELECT ?, ?, id FROM ingredients WHERE name = ?
+            ''', (dish_id, item, term))
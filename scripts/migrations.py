@@ -0,0 +1,258 @@
+"""Versioned schema migrations for the cookbook database.
+
+Each entry in MIGRATIONS upgrades the schema by one version. The number of
+applied steps is stored in ``PRAGMA user_version``, so every step runs exactly
+once per database. Append new steps to the end of the list; never reorder or
+remove existing ones.
+"""
+from .categories import index_dish_categories
+from .ingredients import index_dish_ingredients
+
+def add_dish_columns(c):
+    """Add the category, type and image_path columns to databases that predate them."""
+    # Check if columns exist
+    c.execute("PRAGMA table_info(dishes)")
+    columns = [column[1] for column in c.fetchall()]
+    
+    # Add category column if it doesn't exist
+    if 'category' not in columns:
+        c.execute('ALTER TABLE dishes ADD COLUMN category TEXT NOT NULL DEFAULT "Hlavní jídlo 🍽️"')
+    
+    # Add type column if it doesn't exist
+    if 'type' not in columns:
+        c.execute('ALTER TABLE dishes ADD COLUMN type TEXT NOT NULL DEFAULT "Doma uvařené 🍳"')
+    
+    # Add image_path column if it doesn't exist
+    if 'image_path' not in columns:
+        c.execute('ALTER TABLE dishes ADD COLUMN image_path TEXT')
+
+def add_search_index(c):
+    """Add the full-text search index over dishes, kept in sync by triggers."""
+    # remove_diacritics folds Czech letters so "kase" matches "kaše"
+    c.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS dishes_fts USING fts5(
+            name, ingredients, instructions,
+            content='dishes', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2',
+            prefix='2 3'
+        )
+    ''')
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS dishes_fts_insert AFTER INSERT ON dishes BEGIN
+            INSERT INTO dishes_fts(rowid, name, ingredients, instructions)
+            VALUES (new.id, new.name, new.ingredients, new.instructions);
+        END
+    ''')
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS dishes_fts_delete AFTER DELETE ON dishes BEGIN
+            INSERT INTO dishes_fts(dishes_fts, rowid, name, ingredients, instructions)
+            VALUES ('delete', old.id, old.name, old.ingredients, old.instructions);
+        END
+    ''')
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS dishes_fts_update AFTER UPDATE ON dishes BEGIN
+            INSERT INTO dishes_fts(dishes_fts, rowid, name, ingredients, instructions)
+            VALUES ('delete', old.id, old.name, old.ingredients, old.instructions);
+            INSERT INTO dishes_fts(rowid, name, ingredients, instructions)
+            VALUES (new.id, new.name, new.ingredients, new.instructions);
+        END
+    ''')
+    # Index the recipes that already exist
+    c.execute("INSERT INTO dishes_fts(dishes_fts) VALUES ('rebuild')")
+
+def add_ingredient_index(c):
+    """Add the normalized ingredient index used for pantry queries and fill it.
+
+    Each recipe item is numbered, so any one of its alternatives
+    ("hladká/polohrubá mouka") covers it.
+    """
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS ingredients (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL UNIQUE,
+            label TEXT NOT NULL
+        )
+    ''')
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS dish_ingredients (
+            dish_id INTEGER NOT NULL REFERENCES dishes(id),
+            item INTEGER NOT NULL,
+            ingredient_id INTEGER NOT NULL REFERENCES ingredients(id),
+            PRIMARY KEY (dish_id, item, ingredient_id)
+        )
+    ''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_dish_ingredients_ingredient ON dish_ingredients(ingredient_id)')
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS dish_ingredients_delete AFTER DELETE ON dishes BEGIN
+            DELETE FROM dish_ingredients WHERE dish_id = old.id;
+        END
+    ''')
+    # Index the recipes that already exist
+    c.execute('SELECT id, ingredients FROM dishes')
+    for dish_id, text in c.fetchall():
+        index_dish_ingredients(c, dish_id, text)
+
+def add_listing_index(c):
+    """Add the index that keyset pagination by name walks."""
+    c.execute('CREATE INDEX IF NOT EXISTS idx_dishes_name ON dishes(name, id)')
+
+def add_category_tables(c):
+    """Normalize the comma-joined category strings and index categories and types."""
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS categories (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL UNIQUE
+        )
+    ''')
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS dish_categories (
+            dish_id INTEGER NOT NULL REFERENCES dishes(id),
+            category_id INTEGER NOT NULL REFERENCES categories(id),
+            PRIMARY KEY (dish_id, category_id)
+        )
+    ''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_dish_categories_category ON dish_categories(category_id)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_dishes_type ON dishes(type)')
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS dish_categories_delete AFTER DELETE ON dishes BEGIN
+            DELETE FROM dish_categories WHERE dish_id = old.id;
+        END
+    ''')
+    # Split the category strings of the recipes that already exist
+    c.execute('SELECT id, category FROM dishes')
+    for dish_id, category in c.fetchall():
+        index_dish_categories(c, dish_id, category)
+
+def add_image_variant_columns(c):
+    """Add the columns holding the thumbnail and medium image variant URLs."""
+    c.execute('ALTER TABLE dishes ADD COLUMN thumbnail_path TEXT')
+    c.execute('ALTER TABLE dishes ADD COLUMN medium_path TEXT')
+
+def add_image_manifest(c):
+    """Add the manifest of content-addressed images already stored in the repository."""
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS image_files (
+            filename TEXT PRIMARY KEY,
+            original_name TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            thumbnail_path TEXT,
+            medium_path TEXT
+        )
+    ''')
+
+def add_sync_clock(c):
+    """Add the logical clock of the last operation log entry the database includes."""
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS sync_state (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            clock INTEGER NOT NULL
+        )
+    ''')
+    c.execute('INSERT OR IGNORE INTO sync_state (id, clock) VALUES (1, 0)')
+
+def add_change_tracking(c):
+    """Add creation and modification times and a change feed, all maintained by triggers.
+
+    Every insert, update and delete of a dish takes the next value of a counter:
+    dishes keep the value of their last change in row_version and deleted dishes
+    leave a tombstone, so readers can ask what changed after a version.
+    """
+    c.execute("PRAGMA table_info(dishes)")
+    columns = [column[1] for column in c.fetchall()]
+    for column, definition in (('created_at', 'TEXT'), ('updated_at', 'TEXT'),
+                               ('row_version', 'INTEGER NOT NULL DEFAULT 0')):
+        if column not in columns:
+            c.execute(f'ALTER TABLE dishes ADD COLUMN {column} {definition}')
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS change_counter (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL
+        )
+    ''')
+    c.execute('''
+        CREATE TABLE IF NOT EXISTS deleted_dishes (
+            dish_id INTEGER PRIMARY KEY,
+            version INTEGER NOT NULL,
+            deleted_at TEXT NOT NULL
+        )
+    ''')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_dishes_row_version ON dishes(row_version)')
+    c.execute('CREATE INDEX IF NOT EXISTS idx_deleted_dishes_version ON deleted_dishes(version)')
+
+    # Only text changes need reindexing, not the bookkeeping columns set below
+    c.execute('DROP TRIGGER IF EXISTS dishes_fts_update')
+    c.execute('''
+        CREATE TRIGGER dishes_fts_update AFTER UPDATE OF name, ingredients, instructions ON dishes BEGIN
+            INSERT INTO dishes_fts(dishes_fts, rowid, name, ingredients, instructions)
+            VALUES ('delete', old.id, old.name, old.ingredients, old.instructions);
+            INSERT INTO dishes_fts(rowid, name, ingredients, instructions)
+            VALUES (new.id, new.name, new.ingredients, new.instructions);
+        END
+    ''')
+
+    # Existing dishes count as changed once, in id order; when they were created is unknown
+    c.execute('''
+        UPDATE dishes SET
+            created_at = COALESCE(created_at, CURRENT_TIMESTAMP),
+            updated_at = COALESCE(updated_at, CURRENT_TIMESTAMP),
+            row_version = (SELECT COUNT(*) FROM dishes d WHERE d.id <= dishes.id)
+    ''')
+    c.execute('INSERT OR IGNORE INTO change_counter (id, version) VALUES (1, (SELECT COUNT(*) FROM dishes))')
+
+    # Times given explicitly, as when replaying another replica's change, are kept
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS dishes_changes_insert AFTER INSERT ON dishes BEGIN
+            UPDATE change_counter SET version = version + 1 WHERE id = 1;
+            UPDATE dishes SET
+                created_at = COALESCE(new.created_at, CURRENT_TIMESTAMP),
+                updated_at = COALESCE(new.updated_at, CURRENT_TIMESTAMP),
+                row_version = (SELECT version FROM change_counter WHERE id = 1)
+            WHERE id = new.id;
+            DELETE FROM deleted_dishes WHERE dish_id = new.id;
+        END
+    ''')
+    # Listing the columns keeps the trigger's own update from firing it again
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS dishes_changes_update
+        AFTER UPDATE OF name, ingredients, instructions, category, type,
+                        image_path, thumbnail_path, medium_path ON dishes BEGIN
+            UPDATE change_counter SET version = version + 1 WHERE id = 1;
+            UPDATE dishes SET
+                updated_at = CASE WHEN new.updated_at IS old.updated_at
+                                  THEN CURRENT_TIMESTAMP ELSE new.updated_at END,
+                row_version = (SELECT version FROM change_counter WHERE id = 1)
+            WHERE id = new.id;
+        END
+    ''')
+    c.execute('''
+        CREATE TRIGGER IF NOT EXISTS dishes_changes_delete AFTER DELETE ON dishes BEGIN
+            UPDATE change_counter SET version = version + 1 WHERE id = 1;
+            INSERT OR REPLACE INTO deleted_dishes (dish_id, version, deleted_at)
+            VALUES (old.id, (SELECT version FROM change_counter WHERE id = 1), CURRENT_TIMESTAMP);
+        END
+    ''')
+
+# Ordered migration steps; a database at version N has applied the first N
+MIGRATIONS = [
+    add_dish_columns,
+    add_search_index,
+    add_ingredient_index,
+    add_listing_index,
+    add_category_tables,
+    add_image_variant_columns,
+    add_image_manifest,
+    add_sync_clock,
+    add_change_tracking,
+]
+
+SCHEMA_VERSION = len(MIGRATIONS)
+
+def get_schema_version(c) -> int:
+    """Get the migration version recorded in the database."""
+    c.execute("PRAGMA user_version")
+    return c.fetchone()[0]
+
+def set_schema_version(c, version: int):
+    """Record the migration version in the database."""
+    # PRAGMA statements don't accept bound parameters
+    c.execute(f"PRAGMA user_version = {int(version)}")
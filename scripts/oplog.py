@@ -0,0 +1,61 @@
+"""Row-level operation log synced next to the database snapshot.
+
+Pushing the whole SQLite file for every edit makes sync cost grow with the
+collection. Instead, each sync appends the dish changes it carries to a JSONL
+log stored next to cookbook.db. The first line records the logical clock the
+snapshot includes; every following line is one change stamped with the next
+clock value:
+
+    {"snapshot_clock": 41}
+    {"clock": 42, "op": "update", "id": 7, "values": {...}, ...}
+
+Replicas apply the entries newer than their own clock on top of the snapshot.
+The log is uploaded and downloaded whole, so once it outgrows COMPACT_RATIO of
+the database the sync uploads a fresh snapshot and starts an empty log in the
+same commit.
+"""
+import json
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+# Largest log, as a fraction of the database size, before a sync uploads a fresh
+# snapshot instead. With entries of about 1 KB and a database of about 150 KB,
+# this keeps the average bytes transferred per edit near the lowest possible.
+COMPACT_RATIO = 0.1
+# Change fields that only matter to the replica that made the change
+LOCAL_FIELDS = ('removed_files',)
+
+def op_log_name(db_name: str) -> str:
+    """Get the path of the operation log that belongs to a database."""
+    return f"{os.path.splitext(db_name)[0]}.ops.jsonl"
+
+def parse_op_log(text: Optional[str]) -> Tuple[int, List[Dict[str, Any]]]:
+    """Split a log into the clock of its snapshot and its entries, oldest first."""
+    if not text:
+        return 0, []
+    lines = [json.loads(line) for line in text.splitlines() if line.strip()]
+    return lines[0]['snapshot_clock'], lines[1:]
+
+def format_op_log(snapshot_clock: int, entries: List[Dict[str, Any]]) -> str:
+    """Serialize a log as one JSON object per line."""
+    lines = [{'snapshot_clock': snapshot_clock}] + entries
+    return ''.join(json.dumps(line, ensure_ascii=False, separators=(',', ':')) + '\n' for line in lines)
+
+def make_entries(changes: List[Dict[str, Any]], clock: int) -> List[Dict[str, Any]]:
+    """Stamp recorded dish changes with the clock values that follow clock."""
+    return [
+        {'clock': clock + i, **{key: value for key, value in change.items() if key not in LOCAL_FIELDS}}
+        for i, change in enumerate(changes, start=1)
+    ]
+
+def get_clock(c) -> int:
+    """Get the clock of the last log entry the database includes (0 before the log existed)."""
+    c.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sync_state'")
+    if not c.fetchone():
+        return 0
+    c.execute('SELECT clock FROM sync_state WHERE id = 1')
+    return c.fetchone()[0]
+
+def set_clock(c, clock: int):
+    """Record the clock of the last log entry the database includes."""
+    c.execute('UPDATE sync_state SET clock = ? WHERE id = 1', (clock,))
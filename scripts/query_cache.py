@@ -0,0 +1,66 @@
+"""In-process cache of database query results.
+
+Streamlit reruns a page on every widget interaction, so the same listings are
+queried again and again while the data stays unchanged. Results are cached per
+query, parameters and database version, bounded with least-recently-used
+eviction, and dropped whenever the database changes.
+"""
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable
+
+DEFAULT_MAX_ENTRIES = 256
+
+class QueryCache:
+    """LRU cache of query results shared by all sessions.
+
+    Cached results are handed to every caller as they are, so callers must not
+    modify them.
+    """
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._counters = {'hits': 0, 'misses': 0, 'evictions': 0, 'clears': 0}
+
+    def get(self, key: Hashable, load: Callable[[], Any]) -> Any:
+        """Get a cached result, running the query on a miss.
+
+        Args:
+            key: Query, parameters and database version the result belongs to
+            load: Runs the query
+        """
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self._counters['hits'] += 1
+                return self._entries[key]
+            self._counters['misses'] += 1
+
+        # Query outside the lock so other sessions' hits aren't blocked
+        result = load()
+        with self._lock:
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._counters['evictions'] += 1
+        return result
+
+    def clear(self):
+        """Drop every cached result, after the database changed."""
+        with self._lock:
+            self._entries.clear()
+            self._counters['clears'] += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Get hit and miss counters and the number of cached results."""
+        with self._lock:
+            lookups = self._counters['hits'] + self._counters['misses']
+            return {
+                **self._counters,
+                'hit_rate': self._counters['hits'] / lookups if lookups else 0.0,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+            }
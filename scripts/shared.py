@@ -1,7 +1,7 @@
+import html
 import streamlit as st
-import base64
-from io import BytesIO
-from PIL import Image
+from scripts.image_cache import ImageCache
+from scripts.image_resolver import ImageResolver
 from scripts.translations import TRANSLATIONS
 
 def navigation(t):
@@ -30,42 +30,75 @@ def navigation(t):
                 st.session_state.language = 'cs'
                 st.rerun()
 
+def facet_filters(db, t, key):
+    """
+    Show category and type filter chips with recipe counts.
+    
+    Args:
+        db: Database to count recipes in
+        t: Translation function
+        key: Prefix for the widget keys, unique per page
+    
+    Returns:
+        The selected categories and types (empty lists when nothing is selected)
+    """
+    facets = db.facets()
+    col1, col2 = st.columns(2)
+    with col1:
+        categories = st.multiselect(
+            t('category'),
+            options=list(facets['categories']),
+            format_func=lambda name: f"{name} ({facets['categories'][name]})",
+            key=f"{key}_categories"
+        )
+    with col2:
+        types = st.multiselect(
+            t('type'),
+            options=list(facets['types']),
+            format_func=lambda name: f"{name} ({facets['types'][name]})",
+            key=f"{key}_types"
+        )
+    return categories, types
+
+@st.cache_resource
+def get_image_cache():
+    """Get the image cache shared by all sessions of this server process."""
+    return ImageCache()
+
+@st.cache_resource
+def get_image_resolver():
+    """Get the resolver of stored image paths to the local images/ checkout."""
+    return ImageResolver()
+
 def display_image(image_path, caption=None):
     """
-    Display an image from either a base64 string or a file path.
+    Display an image from either a base64 string, a URL or a file path.
+    
+    Images in the local images/ checkout are read from disk rather than GitHub,
+    and sent resized as cacheable static files when static serving is enabled.
+    All others are served from the local image cache, so after the first view
+    there is no download or decode.
     
     Args:
-        image_path: Can be a base64 string (with or without data URL prefix) or a file path
+        image_path: Can be a base64 string (with or without data URL prefix), a URL or a file path
         caption: Optional caption for the image
     """
     try:
         if not image_path:
             return
-            
-        if image_path.startswith('data:image'):
-            # Handle base64 image data with data URL prefix
-            image_data = image_path.split(',')[1]
-            image_bytes = base64.b64decode(image_data)
-            image = Image.open(BytesIO(image_bytes))
-            st.image(image, caption=caption)
-        elif image_path.startswith('http'):
-            # Handle regular image URLs
-            st.image(image_path, caption=caption)
-        elif image_path.startswith('iVBORw0KGgoAAAANSUhEUg'):  # Common base64 PNG header
-            # Handle raw base64 string without data URL prefix
-            try:
-                image_bytes = base64.b64decode(image_path)
-                image = Image.open(BytesIO(image_bytes))
-                st.image(image, caption=caption)
-            except Exception as e:
-                st.warning(f"Could not decode base64 image: {str(e)}")
-                # Try to display as raw base64 with data URL prefix
-                try:
-                    st.image(f"data:image/png;base64,{image_path}", caption=caption)
-                except:
-                    st.error("Failed to display image in any format")
-        else:
-            # Handle regular file paths
-            st.image(image_path, caption=caption)
+        
+        resolver = get_image_resolver()
+        cache = get_image_cache()
+        static_url = resolver.static_url(image_path, cache.get)
+        if static_url:
+            # Let the browser fetch (and keep) the file straight from the server
+            caption_html = f'<figcaption style="text-align: center; opacity: 0.6">{html.escape(caption)}</figcaption>' if caption else ''
+            st.markdown(
+                f'<figure><img src="{static_url}" style="width: 100%" alt="{html.escape(caption or "")}">{caption_html}</figure>',
+                unsafe_allow_html=True
+            )
+            return
+        
+        st.image(cache.get(resolver.resolve(image_path)), caption=caption)
     except Exception as e:
-        st.warning(f"Could not display image: {str(e)}")
\ No newline at end of file
+        st.warning(f"Could not display image: {str(e)}")
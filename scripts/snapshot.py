@@ -0,0 +1,50 @@
+"""Immutable in-memory copies of the database for readers.
+
+Writes go through a connection to cookbook.db on disk. After every change the
+database is copied page by page into a shared in-memory database and published
+as a new Snapshot, which readers query without touching the disk or waiting
+for writers and GitHub refreshes.
+"""
+import itertools
+import sqlite3
+import threading
+from typing import List
+
+# Names of shared in-memory databases are global to the process
+_names = itertools.count(1)
+
+class Snapshot:
+    """One version of the database, held in memory once for all readers.
+
+    The copy never changes after it's made, so every reader connection opens
+    the same buffer as immutable and any number of sessions can read it at
+    once. Connections are pooled and reused until a newer snapshot replaces
+    this one; the memory is freed when the last of them is closed.
+    """
+
+    def __init__(self, version: int, source: sqlite3.Connection):
+        self.version = version
+        self.uri = f"file:/cookbook-snapshot-{next(_names)}?vfs=memdb"
+        # The owner connection keeps the shared database alive
+        self._owner = sqlite3.connect(self.uri, uri=True, check_same_thread=False)
+        source.backup(self._owner)
+        self._pool: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+
+    def acquire(self) -> sqlite3.Connection:
+        """Get a read-only connection to this snapshot, opening one if none is free."""
+        with self._lock:
+            if self._pool:
+                return self._pool.pop()
+        # The copy keeps the WAL header of the file on disk, which in-memory
+        # databases can only be opened with as immutable. Pooled connections
+        # are handed from thread to thread, one at a time.
+        conn = sqlite3.connect(f"{self.uri}&immutable=1", uri=True, check_same_thread=False)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA query_only = ON")
+        return conn
+
+    def release(self, conn: sqlite3.Connection):
+        """Return a connection from acquire() to the pool."""
+        with self._lock:
+            self._pool.append(conn)
@@ -0,0 +1,233 @@
+import atexit
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+# Seconds to collect further edits before uploading them as one commit
+DEFAULT_SYNC_DELAY = 3.0
+# Longest wait between retries of a failing upload; each failure doubles the wait
+MAX_RETRY_DELAY = 300.0
+# Seconds between checks for a newer database on GitHub
+DEFAULT_POLL_INTERVAL = 30.0
+
+class SyncWorker:
+    """Background worker that coalesces database changes into one GitHub upload.
+
+    Writers call mark_dirty() after committing locally. The worker waits for the
+    sync delay so that a burst of edits is pushed as a single commit, and flushes
+    whatever is still pending when the process exits. Failed uploads are retried
+    with capped exponential backoff, so an error that doesn't clear can't use up
+    the GitHub API quota.
+    """
+
+    def __init__(self, upload: Callable[[], Optional[str]], delay: float = DEFAULT_SYNC_DELAY):
+        """
+        Args:
+            upload: Callable that pushes the current database and returns its SHA
+            delay: Seconds to wait after the first change before uploading
+        """
+        self._upload = upload
+        self.delay = delay
+        self._condition = threading.Condition()
+        self._dirty_since = None
+        self._in_flight = False
+        self._stopped = False
+        self._attempts = 0
+        self._failures = 0
+        self._retry_at = 0.0
+        self.last_synced_sha = None
+        self.last_synced_at = None
+        self.last_error = None
+
+        self._thread = threading.Thread(target=self._run, name="cookbook-sync", daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    @property
+    def pending(self) -> bool:
+        """Whether there are local changes not yet on GitHub."""
+        with self._condition:
+            return self._dirty_since is not None or self._in_flight
+
+    def mark_dirty(self):
+        """Schedule an upload of the local database."""
+        with self._condition:
+            if self._dirty_since is None:
+                self._dirty_since = time.monotonic()
+            self._condition.notify_all()
+
+    def status(self) -> Dict[str, Any]:
+        """Get the sync state for display."""
+        with self._condition:
+            return {
+                'pending': self._dirty_since is not None or self._in_flight,
+                'last_synced_sha': self.last_synced_sha,
+                'last_synced_at': self.last_synced_at,
+                'last_error': self.last_error,
+                'failures': self._failures,
+                # Wall-clock time of the next upload attempt after a failure
+                'next_retry_at': time.time() + self._retry_at - time.monotonic() if self._failures else None,
+            }
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Upload pending changes now and wait until nothing is pending.
+
+        Returns:
+            True if everything was synced, False on timeout or upload error
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            # Make the pending change due immediately, skipping any backoff
+            if self._dirty_since is not None:
+                self._dirty_since = time.monotonic() - self.delay
+                self._retry_at = 0.0
+                self._condition.notify_all()
+            attempts = self._attempts
+            while self._dirty_since is not None or self._in_flight:
+                if self._attempts > attempts and self.last_error is not None:
+                    return False
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+            return self.last_error is None
+
+    def stop(self, timeout: float = 30.0):
+        """Flush pending changes and stop the worker thread."""
+        self.flush(timeout)
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+        self._thread.join(timeout)
+        atexit.unregister(self.stop)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._stopped and (
+                    self._dirty_since is None
+                    or time.monotonic() < self._due()
+                ):
+                    if self._dirty_since is None:
+                        self._condition.wait()
+                    else:
+                        self._condition.wait(self._due() - time.monotonic())
+                if self._stopped:
+                    return
+                # Changes made from here on are picked up by the next upload
+                self._dirty_since = None
+                self._in_flight = True
+
+            try:
+                sha = self._upload()
+                error = None
+            except Exception as e:
+                sha = None
+                error = str(e)
+
+            with self._condition:
+                self._in_flight = False
+                self._attempts += 1
+                if error is None:
+                    self.last_synced_sha = sha
+                    self.last_synced_at = time.time()
+                    self.last_error = None
+                    self._failures = 0
+                    self._retry_at = 0.0
+                else:
+                    self.last_error = error
+                    self._failures += 1
+                    # Jitter keeps replicas that failed together from retrying together
+                    backoff = min(self.delay * 2 ** min(self._failures, 16), MAX_RETRY_DELAY)
+                    self._retry_at = time.monotonic() + backoff * random.uniform(0.5, 1.0)
+                    # Newer changes are picked up by the retry too
+                    if self._dirty_since is None:
+                        self._dirty_since = time.monotonic()
+                self._condition.notify_all()
+
+    def _due(self) -> float:
+        """Monotonic time the pending upload is due, holding the condition."""
+        return max(self._dirty_since + self.delay, self._retry_at)
+
+
+class ChangeWatcher:
+    """Background worker that keeps the local database in step with GitHub.
+
+    Page renders never wait on GitHub: they read the local copy, which is at
+    most one poll interval behind. Refresh traffic depends on the interval,
+    not on how many pages are rendered.
+    """
+
+    def __init__(self, poll: Callable[[], bool], interval: float = DEFAULT_POLL_INTERVAL):
+        """
+        Args:
+            poll: Callable that fetches the database if it changed and returns
+                whether a newer version was loaded
+            interval: Seconds between polls
+        """
+        self._poll = poll
+        self.interval = interval
+        self._condition = threading.Condition()
+        self._wake = False
+        self._stopped = False
+        self.checks = 0
+        self.changes = 0
+        self.last_checked_at = None
+        self.last_changed_at = None
+        self.last_error = None
+
+        self._thread = threading.Thread(target=self._run, name="cookbook-watch", daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def check_now(self):
+        """Poll GitHub without waiting for the rest of the interval."""
+        with self._condition:
+            self._wake = True
+            self._condition.notify_all()
+
+    def status(self) -> Dict[str, Any]:
+        """Get the polling state for display."""
+        with self._condition:
+            return {
+                'interval': self.interval,
+                'checks': self.checks,
+                'changes': self.changes,
+                'last_checked_at': self.last_checked_at,
+                'last_changed_at': self.last_changed_at,
+                'last_error': self.last_error,
+            }
+
+    def stop(self, timeout: float = 5.0):
+        """Stop the worker thread."""
+        with self._condition:
+            self._stopped = True
+            self._condition.notify_all()
+        self._thread.join(timeout)
+        atexit.unregister(self.stop)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                deadline = time.monotonic() + self.interval
+                while not self._stopped and not self._wake and time.monotonic() < deadline:
+                    self._condition.wait(deadline - time.monotonic())
+                if self._stopped:
+                    return
+                self._wake = False
+
+            try:
+                changed = self._poll()
+                error = None
+            except Exception as e:
+                changed = False
+                error = str(e)
+
+            with self._condition:
+                self.checks += 1
+                self.last_checked_at = time.time()
+                self.last_error = error
+                if changed:
+                    self.changes += 1
+                    self.last_changed_at = self.last_checked_at
@@ -32,6 +32,22 @@ TRANSLATIONS = {
         'delete_failed': 'Failed to delete recipe!',
         'image_not_found': 'Image not found',
         'uncategorized': 'Uncategorized',
+        'sync_pending': '⏳ Changes are being saved to GitHub...',
+        'sync_done': '✅ All changes saved to GitHub',
+        'api_quota': 'GitHub API calls left this hour',
+        'query_cache': 'Query cache hit rate',
+        'sync_failed': 'Saving changes to GitHub failed, retrying',
+        'sync_retry_at': 'next attempt at',
+        'search_tab': '🔍 Search',
+        'pantry_tab': '🧺 What can I cook?',
+        'pantry_placeholder': 'Ingredients you have, separated by commas',
+        'pantry_all': 'You have everything',
+        'pantry_missing_one': 'Missing one ingredient',
+        'pantry_missing_two': 'Missing two ingredients',
+        'pantry_missing': 'Missing',
+        'show_recipe': 'Show recipe',
+        'previous_page': '← Previous',
+        'next_page': 'Next →',
     },
     'cs': {
         'app_title': 'Můj receptář',
@@ -66,5 +82,21 @@ TRANSLATIONS = {
         'delete_failed': 'Nepodařilo se smazat recept!',
         'image_not_found': 'Obrázek nenalezen',
         'uncategorized': 'Nekategorizováno',
+        'sync_pending': '⏳ Změny se ukládají na GitHub...',
+        'sync_done': '✅ Všechny změny uloženy na GitHub',
+        'api_quota': 'Zbývající volání GitHub API v této hodině',
+        'query_cache': 'Úspěšnost mezipaměti dotazů',
+        'sync_failed': 'Uložení změn na GitHub selhalo, zkouším znovu',
+        'sync_retry_at': 'další pokus v',
+        'search_tab': '🔍 Hledat',
+        'pantry_tab': '🧺 Co můžu uvařit?',
+        'pantry_placeholder': 'Ingredience, které máte doma, oddělené čárkami',
+        'pantry_all': 'Máte všechno',
+        'pantry_missing_one': 'Chybí jedna ingredience',
+        'pantry_missing_two': 'Chybí dvě ingredience',
+        'pantry_missing': 'Chybí',
+        'show_recipe': 'Zobrazit recept',
+        'previous_page': '← Předchozí',
+        'next_page': 'Další →',
     }
 } 
\ No newline at end of file
@@ -0,0 +1,100 @@
+import hashlib
+import os
+import sqlite3
+import time
+from typing import Any, Dict, Optional
+
+# full: content hash + integrity_check every time (slowest)
+# tiered: content hash + quick_check, integrity_check periodically or after a mismatch
+# hash: content hash only, integrity_check periodically or after a mismatch
+VERIFY_MODES = ('full', 'tiered', 'hash')
+DEFAULT_VERIFY_MODE = 'tiered'
+# Seconds between full integrity checks in the cheaper modes
+DEFAULT_FULL_CHECK_INTERVAL = 6 * 60 * 60
+
+def git_blob_sha(path: str, chunk_size: int = 1024 * 1024) -> str:
+    """Compute the SHA GitHub reports for a file's blob, reading it in chunks."""
+    digest = hashlib.sha1(f"blob {os.path.getsize(path)}\0".encode())
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def git_blob_sha_bytes(content: bytes) -> str:
+    """Compute the SHA GitHub reports for a blob with the given content."""
+    digest = hashlib.sha1(f"blob {len(content)}\0".encode())
+    digest.update(content)
+    return digest.hexdigest()
+
+class Verifier:
+    """Checks database files on sync at a cost chosen by the verification mode."""
+
+    def __init__(self, mode: str = DEFAULT_VERIFY_MODE, full_check_interval: float = DEFAULT_FULL_CHECK_INTERVAL):
+        if mode not in VERIFY_MODES:
+            raise ValueError(f"Unknown verification mode '{mode}', expected one of {', '.join(VERIFY_MODES)}")
+        self.mode = mode
+        self.full_check_interval = full_check_interval
+        # Run a full check the first time round
+        self._full_due = True
+        self._last_full_at = None
+        self._timings = {}
+        self._counts = {'hash': 0, 'quick': 0, 'full': 0, 'mismatches': 0}
+
+    def report_mismatch(self):
+        """Record a hash mismatch so the next verification runs a full check."""
+        self._counts['mismatches'] += 1
+        self._full_due = True
+
+    def verify(self, path: str, expected_sha: Optional[str] = None):
+        """Verify a database file, raising if it is damaged.
+
+        Args:
+            path: Database file to check
+            expected_sha: Blob SHA GitHub reported for the file, if known
+        """
+        if expected_sha:
+            sha = self._timed('hash', git_blob_sha, path)
+            if sha != expected_sha:
+                self.report_mismatch()
+                raise Exception(f"Database content hash {sha[:7]} does not match GitHub's {expected_sha[:7]}")
+
+        if self.mode == 'full' or self._full_check_due():
+            self._timed('full', self._pragma_check, path, "integrity_check")
+            self._full_due = False
+            self._last_full_at = time.monotonic()
+        elif self.mode == 'tiered':
+            self._timed('quick', self._pragma_check, path, "quick_check")
+
+    def stats(self) -> Dict[str, Any]:
+        """Get the check counts and the duration of the last check of each kind in milliseconds."""
+        return {
+            'mode': self.mode,
+            'counts': dict(self._counts),
+            'last_ms': dict(self._timings),
+            'full_check_due': self._full_check_due(),
+        }
+
+    def _full_check_due(self) -> bool:
+        if self._full_due or self._last_full_at is None:
+            return True
+        return time.monotonic() - self._last_full_at >= self.full_check_interval
+
+    def _timed(self, kind: str, check, *args):
+        start = time.perf_counter()
+        try:
+            return check(*args)
+        finally:
+            self._timings[kind] = round((time.perf_counter() - start) * 1000, 2)
+            self._counts[kind] += 1
+
+    @staticmethod
+    def _pragma_check(path: str, pragma: str):
+        conn = sqlite3.connect(path)
+        try:
+            c = conn.cursor()
+            c.execute(f"PRAGMA {pragma}")
+            result = c.fetchone()
+        finally:
+            conn.close()
+        if result[0] != "ok":
+            raise Exception(f"Database {pragma.replace('_', ' ')} failed: {result[0]}")